@@ -29,6 +29,8 @@ from src.models.exercise import Exercise
 from src.models.laboratory import Laboratory
 from src.models.exercise_history import ExerciseHistory
 from src.models.report import Report
+from src.models.exercise_expected_result import ExerciseExpectedResult
+from src.models.exercise_verdict import ExerciseVerdict
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,72 @@
+# Per-row cost of turning fetched Oracle rows into a JSON response body,
+# before (recursive make_dict_json_serializable + jsonable_encoder + json)
+# and after (outputtypehandler conversion at fetch time + orjson).
+# Run from the repository root: python -m benchmarks.bench_row_conversion
+import datetime
+import decimal
+import json
+import timeit
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from src.utils.result_format import format_query_result
+
+COLUMNS = ["NR_MATRICOL", "NUME", "PRENUME", "AN", "BURSA", "DATA_NASTERE", "DATA_NOTARE"]
+ROW_COUNT = 2000
+DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+
+def make_rows():
+    base = datetime.datetime(2001, 1, 1, 8, 30)
+    return [
+        (f"{index:03d}AB", "Popescu", "Ion", index % 3 + 1, 1350.5, base + datetime.timedelta(days=index),
+         base + datetime.timedelta(hours=index))
+        for index in range(ROW_COUNT)
+    ]
+
+
+def legacy_make_dict_json_serializable(data):
+    if isinstance(data, dict):
+        return {key: legacy_make_dict_json_serializable(value) for key, value in data.items()}
+
+    elif isinstance(data, list):
+        return [legacy_make_dict_json_serializable(item) for item in data]
+
+    elif isinstance(data, (datetime.date, datetime.datetime)):
+        return data.strftime(DATETIME_FORMAT)
+
+    elif isinstance(data, decimal.Decimal):
+        return str(data)
+
+    else:
+        return data
+
+
+def legacy(rows):
+    raw_rows = [dict(zip(COLUMNS, row)) for row in rows]
+    clean_rows = legacy_make_dict_json_serializable(raw_rows)
+    content = jsonable_encoder({"success": True, "data": {"columns": COLUMNS, "rows": clean_rows}})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def driver_converted(rows):
+    # what the outputtypehandler's outconverter does while the rows are fetched
+    return [row[:5] + (row[5].strftime(DATETIME_FORMAT), row[6].strftime(DATETIME_FORMAT)) for row in rows]
+
+
+def current(rows):
+    fetched = driver_converted(rows)
+    data = format_query_result({"columns": COLUMNS, "rows": fetched})
+    return orjson.dumps({"success": True, "data": data}, default=jsonable_encoder)
+
+
+def run(label, func, rows, number=20):
+    elapsed = timeit.timeit(lambda: func(rows), number=number)
+    print(f"{label:<40} {elapsed / (number * len(rows)) * 1e6:8.3f} us/row")
+
+
+if __name__ == "__main__":
+    sample = make_rows()
+    run("make_dict_json_serializable + json", legacy, sample)
+    run("outputtypehandler + orjson", current, sample)
@@ -0,0 +1,62 @@
+# Compares the single-pass classifier with the regex scans it replaced.
+# Run from the repository root: python -m benchmarks.bench_sql_classifier
+import re
+import timeit
+
+from src.utils.sql_lexer import classify_statement
+
+QUERIES = [
+    "SELECT * FROM studenti",
+    "SELECT s.nume, s.prenume, AVG(n.valoare) FROM studenti s JOIN note n ON s.nr_matricol = n.nr_matricol "
+    "GROUP BY s.nume, s.prenume HAVING AVG(n.valoare) > 8 ORDER BY 3 DESC",
+    "UPDATE studenti SET bursa = bursa * 1.1 WHERE an = 3",
+    "SELECT 'update' AS word FROM dual -- delete this comment",
+    "INSERT INTO note (nr_matricol, id_curs, valoare) SELECT nr_matricol, 1, 10 FROM studenti WHERE an = 1",
+]
+
+
+def legacy_check_for_ddl(query: str):
+    matches = ["create", "drop", "alter", "truncate"]
+    words = re.findall(r"\w+", query)
+    return any(word.lower() in matches for word in words)
+
+
+def legacy_check_for_tcl(query: str):
+    matches = ["commit", "savepoint", "rollback"]
+    words = re.findall(r"\w+", query)
+    return any(word.lower() in matches for word in words)
+
+
+def legacy_check_is_dml(query: str):
+    matches = ['update', 'delete', 'insert', 'alter', 'drop']
+    words = re.findall(r"\w+", query)
+    return any(word.lower() in matches for word in words)
+
+
+def legacy_extract_table_from_dml(query: str):
+    match = re.search(r"(?:INSERT\s+INTO|UPDATE|DELETE\s+(?:FROM)?)\s+([a-zA-Z0-9_$#]+)", query, re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+
+def legacy_classify(query: str):
+    legacy_check_for_ddl(query)
+    legacy_check_for_tcl(query)
+    is_dml = legacy_check_is_dml(query)
+    return is_dml, legacy_extract_table_from_dml(query) if is_dml else None, "order by" in query.lower()
+
+
+def uncached_classify(query: str):
+    return classify_statement.__wrapped__(query)
+
+
+def run(label, func, number=20000):
+    elapsed = timeit.timeit(lambda: [func(query) for query in QUERIES], number=number)
+    per_call = elapsed / (number * len(QUERIES)) * 1e6
+    print(f"{label:<28} {per_call:8.2f} us/query")
+
+
+if __name__ == "__main__":
+    run("legacy regex scans", legacy_classify)
+    run("single-pass lexer", uncached_classify)
+    classify_statement.cache_clear()
+    run("single-pass lexer (cached)", classify_statement)
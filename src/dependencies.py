@@ -1,10 +1,44 @@
-from fastapi import Depends, Request
+import math
+
+from decouple import config
+from fastapi import Depends, Request, Query
+from starlette.concurrency import run_in_threadpool
 
 from src.exceptions.exceptions import AppException
 from src.utils.jwt_bearer import JwtBearer
 from src.utils.jwt_handler import decode_jwt
+from src.utils.metrics import counters
+from src.utils.rate_limit import TokenBucketLimiter, RedisTokenBucketLimiter
+from src.utils.result_format import RESULT_FORMATS, ACCEPT_MEDIA_TYPES, ROWS
 from utils.contants import ErrorCodes
 
+RATE_LIMIT = config("RATE_LIMIT", default=True, cast=bool)
+# The memory backend limits each worker on its own, with WEB_CONCURRENCY > 1 only redis enforces the rates below
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="memory")
+RATE_LIMIT_REDIS_URL = config("RATE_LIMIT_REDIS_URL", default="redis://localhost:6379/0")
+RATE_LIMIT_KEY = config("RATE_LIMIT_KEY", default="sql_learner:rate_limit")
+ROLE_NAMES = {0: "student", 1: "admin", 2: "super_admin"}
+# Tokens per second and burst size, a rate of 0 disables the limit for that role
+RATE_LIMITS = {
+    "student": (config("RATE_LIMIT_STUDENT_RATE", default=1.0, cast=float),
+                config("RATE_LIMIT_STUDENT_BURST", default=10, cast=int)),
+    "admin": (config("RATE_LIMIT_ADMIN_RATE", default=5.0, cast=float),
+              config("RATE_LIMIT_ADMIN_BURST", default=50, cast=int)),
+    "super_admin": (config("RATE_LIMIT_SUPER_ADMIN_RATE", default=0.0, cast=float),
+                    config("RATE_LIMIT_SUPER_ADMIN_BURST", default=0, cast=int)),
+}
+
+
+def create_rate_limiter():
+    if RATE_LIMIT_BACKEND == "redis":
+        import redis
+        return RedisTokenBucketLimiter(redis.Redis.from_url(RATE_LIMIT_REDIS_URL, decode_responses=True),
+                                       RATE_LIMIT_KEY)
+    return TokenBucketLimiter()
+
+
+rate_limiter = create_rate_limiter()
+
 
 async def get_current_user(request: Request, token: str = Depends(JwtBearer())):
     payload = decode_jwt(token)
@@ -31,3 +65,42 @@ async def is_super_admin(request: Request, token: str = Depends(JwtBearer())):
         raise AppException(ErrorCodes.SUPER_ADMIN_ACCESS_REQUIRED, 403)
 
     return True
+
+
+
+async def get_result_format(request: Request, result_format: str | None = Query(default=None, alias="format")):
+    if result_format:
+        if result_format not in RESULT_FORMATS:
+            raise AppException(ErrorCodes.UNSUPPORTED_RESULT_FORMAT, 406)
+        return result_format
+
+    accept = request.headers.get("accept", "")
+    for media_type, accepted_format in ACCEPT_MEDIA_TYPES.items():
+        if media_type in accept:
+            return accepted_format
+    return ROWS
+
+
+def rate_limit(scope: str):
+    async def rate_limited_user(user_data=Depends(get_current_user)):
+        if not RATE_LIMIT:
+            return user_data
+
+        role = ROLE_NAMES.get(user_data["role"], "student")
+        rate, burst = RATE_LIMITS[role]
+        if rate <= 0:
+            return user_data
+
+        key = (scope, user_data["id"])
+        if rate_limiter.backend == "memory":
+            retry_after = rate_limiter.acquire(key, rate, burst)
+        else:
+            # A round trip to Redis would block the event loop
+            retry_after = await run_in_threadpool(rate_limiter.acquire, key, rate, burst)
+        if retry_after:
+            counters.increment(f"rate_limit.throttled.{scope}.{role}")
+            raise AppException(ErrorCodes.RATE_LIMITED, 429, headers={"Retry-After": str(math.ceil(retry_after))})
+        counters.increment(f"rate_limit.allowed.{scope}.{role}")
+        return user_data
+
+    return rate_limited_user
@@ -1,5 +1,8 @@
 class AppException(Exception):
-    def __init__(self, message: str, status_code: int = 400, details: dict | None = None):
+    def __init__(self, message: str, status_code: int = 400, details: dict | None = None,
+                 headers: dict | None = None):
         self.message = message
         self.status_code = status_code
         self.details = details
+        self.headers = headers
+        self.shared = False
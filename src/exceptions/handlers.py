@@ -13,6 +13,7 @@ def register_exception_handlers(app: FastAPI):
             content={"success": False, "error": {
                 "status_code": exc.status_code, "message": exc.message, "details": exc.details
             }},
+            headers=exc.headers,
         )
 
     @app.exception_handler(RequestValidationError)
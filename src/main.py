@@ -8,7 +8,8 @@ import src.models.user as user_model
 from routers.ai_generator import ai_generator_router
 from src.database import engine
 from src.exceptions.handlers import register_exception_handlers
-from src.oracle_db import create_oracle_pool, close_oracle_pool
+from src.oracle_db import create_oracle_pool, close_oracle_pool, create_oracle_pool_async, close_oracle_pool_async, \
+    ORACLE_ASYNC
 from src.routers.admin import admin_router
 from src.routers.auth import auth_router
 from src.routers.laboratory import laboratory_router
@@ -16,6 +17,9 @@ from src.routers.exercise import exercise_router
 from src.routers.exercise_history import exercise_history_router
 from src.routers.query import query_runner_router
 from src.routers.report import report_router
+from src.services.dml_sandbox import DML_SANDBOX, provision_sandboxes
+from src.services.grading_jobs import GRADING_QUEUE, start_grading_workers, stop_grading_workers
+from src.services.regrade import REGRADE_JOBS, start_regrade_runner, stop_regrade_runner
 
 origins = [
     "http://localhost:5173"
@@ -25,7 +29,21 @@ origins = [
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_oracle_pool()
+    if ORACLE_ASYNC:
+        create_oracle_pool_async()
+    if DML_SANDBOX:
+        provision_sandboxes()
+    if GRADING_QUEUE:
+        start_grading_workers()
+    if REGRADE_JOBS:
+        start_regrade_runner()
     yield
+    if REGRADE_JOBS:
+        stop_regrade_runner()
+    if GRADING_QUEUE:
+        stop_grading_workers()
+    if ORACLE_ASYNC:
+        await close_oracle_pool_async()
     close_oracle_pool()
 
 
@@ -1,5 +1,8 @@
 from src.models.user import User
 from src.models.laboratory import Laboratory
 from src.models.exercise import Exercise
+from src.models.exercise_expected_result import ExerciseExpectedResult
+from src.models.exercise_verdict import ExerciseVerdict
+from src.models.regrade_job import RegradeJob
 
-__all__ = ["User", "Laboratory", "Exercise"]
\ No newline at end of file
+__all__ = ["User", "Laboratory", "Exercise", "ExerciseExpectedResult", "ExerciseVerdict", "RegradeJob"]
\ No newline at end of file
@@ -21,3 +21,6 @@ class Exercise(Base):
 
     laboratory = relationship("Laboratory", back_populates="exercises")
     user = relationship("User", back_populates="exercises")
+    expected_result = relationship("ExerciseExpectedResult", back_populates="exercise", uselist=False,
+                                   cascade="all, delete-orphan")
+    verdicts = relationship("ExerciseVerdict", cascade="all, delete-orphan", passive_deletes=True)
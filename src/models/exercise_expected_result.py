@@ -0,0 +1,27 @@
+import uuid
+
+from sqlalchemy import Column, String, DateTime, Boolean, Integer, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import relationship
+
+from src.database import Base
+
+
+class ExerciseExpectedResult(Base):
+    __tablename__ = "exercises_expected_results"
+
+    id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
+    exercise_id = Column(UUID, ForeignKey("exercises.id"), unique=True, index=True)
+    columns = Column(JSONB)
+    rows = Column(JSONB)
+    row_count = Column(Integer)
+    has_order = Column(Boolean, default=False)
+    is_dml = Column(Boolean, default=False)
+    is_delta = Column(Boolean, default=False)
+    target_table = Column(String)
+    dataset_version = Column(String)
+    version = Column(Integer, default=1)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+    exercise = relationship("Exercise", back_populates="expected_result")
@@ -1,10 +1,16 @@
 import uuid
 
-from sqlalchemy import Column, String, DateTime, Boolean
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import relationship
 
 from src.database import Base
 
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
 
 class ExerciseHistory(Base):
     __tablename__ = "exercises_history"
@@ -16,4 +22,16 @@ class ExerciseHistory(Base):
     laboratory_id = Column(UUID)
     user_id = Column(UUID)
     created_at = Column(DateTime)
-    result_details = Column(JSONB)
+    stored_result_details = Column("result_details", JSONB)
+    verdict_id = Column(UUID, ForeignKey("exercise_verdicts.id", ondelete="SET NULL"), nullable=True, index=True)
+    status = Column(String, default=DONE, index=True)
+    lease_id = Column(UUID, nullable=True)
+    leased_at = Column(DateTime, nullable=True)
+
+    verdict = relationship("ExerciseVerdict", lazy="joined")
+
+    @property
+    def result_details(self):
+        if self.stored_result_details is None and self.verdict is not None:
+            return self.verdict.result_details
+        return self.stored_result_details
@@ -0,0 +1,25 @@
+import uuid
+
+from sqlalchemy import Column, String, DateTime, Boolean, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from src.database import Base
+from src.utils.result_format import format_validation
+
+
+class ExerciseVerdict(Base):
+    __tablename__ = "exercise_verdicts"
+    __table_args__ = (UniqueConstraint("exercise_id", "exercise_version", "sql_hash"),)
+
+    id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
+    exercise_id = Column(UUID, ForeignKey("exercises.id", ondelete="CASCADE"), index=True)
+    exercise_version = Column(Integer)
+    sql_hash = Column(String(64))
+    success = Column(Boolean)
+    validation = Column(JSONB)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime)
+
+    @property
+    def result_details(self):
+        return format_validation({"validation": self.validation})["validation"]
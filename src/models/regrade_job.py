@@ -0,0 +1,31 @@
+import uuid
+
+from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from src.database import Base
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+
+class RegradeJob(Base):
+    __tablename__ = "regrade_jobs"
+
+    id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
+    exercise_id = Column(UUID, index=True)
+    status = Column(String, default=PENDING, index=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    changed = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    last_history_id = Column(UUID, nullable=True)
+    lease_id = Column(UUID, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,8 +1,15 @@
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Generator, AsyncGenerator
 
 import oracledb
 from decouple import config
-from fastapi import HTTPException
+from fastapi import HTTPException, Depends
+
+from src.dependencies import get_current_user
+from src.exceptions.exceptions import AppException
+from src.utils.admission import AdmissionGate
+from src.utils.contants import ErrorCodes
+from src.utils.metrics import counters
 
 POSTGRES_USER = config("postgres_user")
 POSTGRES_PASS = config("postgres_password")
@@ -16,6 +23,102 @@ DB_SERVICE = config("ORACLE_SERVICE")
 
 DSN = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
 
+ORACLE_DRCP = config("ORACLE_DRCP", default=False, cast=bool)
+ORACLE_DRCP_CCLASS = config("ORACLE_DRCP_CCLASS", default="SQLLEARNER")
+ORACLE_DRCP_PURITY = config("ORACLE_DRCP_PURITY", default="self")
+# DRCP doesn't serve administrative connections
+ORACLE_SYSDBA = config("ORACLE_SYSDBA", default=not ORACLE_DRCP, cast=bool)
+DRCP_PURITIES = {
+    "self": oracledb.PURITY_SELF,
+    "new": oracledb.PURITY_NEW,
+}
+
+ORACLE_POOL_INCREMENT = config("ORACLE_POOL_INCREMENT", default=1, cast=int)
+ORACLE_POOL_WAIT_TIMEOUT_MS = config("ORACLE_POOL_WAIT_TIMEOUT_MS", default=5000, cast=int)
+ORACLE_POOL_MAX_LIFETIME_SESSION = config("ORACLE_POOL_MAX_LIFETIME_SESSION", default=0, cast=int)
+ORACLE_POOL_BORROW = config("ORACLE_POOL_BORROW", default=True, cast=bool)
+ORACLE_POOL_IDLE_TIMEOUT = config("ORACLE_POOL_IDLE_TIMEOUT", default=60, cast=int)
+ORACLE_ADMISSION_QUEUE_DEPTH = config("ORACLE_ADMISSION_QUEUE_DEPTH", default=20, cast=int)
+ORACLE_ADMISSION_MAX_WAIT = config("ORACLE_ADMISSION_MAX_WAIT", default=5.0, cast=float)
+ORACLE_RETRY_AFTER = config("ORACLE_RETRY_AFTER", default=2, cast=int)
+ORACLE_ASYNC = config("ORACLE_ASYNC", default=False, cast=bool)
+
+PLAYGROUND = "playground"
+GRADING = "grading"
+AUTHORING = "authoring"
+PARSE = "parse"
+BATCH = "batch"
+CALL_TIMEOUTS_MS = {
+    PLAYGROUND: config("ORACLE_CALL_TIMEOUT_PLAYGROUND_MS", default=5000, cast=int),
+    GRADING: config("ORACLE_CALL_TIMEOUT_GRADING_MS", default=10000, cast=int),
+    AUTHORING: config("ORACLE_CALL_TIMEOUT_AUTHORING_MS", default=30000, cast=int),
+    PARSE: config("ORACLE_CALL_TIMEOUT_PARSE_MS", default=2000, cast=int),
+    BATCH: config("ORACLE_CALL_TIMEOUT_BATCH_MS", default=10000, cast=int),
+}
+CALL_TIMEOUT_ERRORS = ("DPY-4024", "ORA-03156", "ORA-01013")
+
+
+def workload_pool_config(workload: str, pool_min: int, pool_max: int, priority: int, lends: bool = True,
+                         queue_depth: int = ORACLE_ADMISSION_QUEUE_DEPTH,
+                         max_wait: float = ORACLE_ADMISSION_MAX_WAIT) -> dict:
+    prefix = f"ORACLE_POOL_{workload.upper()}"
+    return {
+        "min": config(f"{prefix}_MIN", default=pool_min, cast=int),
+        "max": config(f"{prefix}_MAX", default=pool_max, cast=int),
+        "wait_timeout": config(f"{prefix}_WAIT_TIMEOUT_MS", default=ORACLE_POOL_WAIT_TIMEOUT_MS, cast=int),
+        "priority": config(f"{prefix}_PRIORITY", default=priority, cast=int),
+        "lends": lends,
+        "queue_depth": config(f"{prefix}_QUEUE_DEPTH", default=queue_depth, cast=int),
+        "max_wait": config(f"{prefix}_MAX_WAIT", default=max_wait, cast=float),
+    }
+
+
+# Every workload owns its sessions, a playground burst can't take the ones graded submissions rely on
+WORKLOAD_POOLS = {
+    GRADING: workload_pool_config(GRADING, 1, 3, 2),
+    PLAYGROUND: workload_pool_config(PLAYGROUND, 1, 2, 1),
+    AUTHORING: workload_pool_config(AUTHORING, 0, 1, 0),
+    # Editor syntax checks get a small budget of their own that other workloads can't borrow
+    PARSE: workload_pool_config(PARSE, 0, 1, 0, lends=False, queue_depth=5, max_wait=0.5),
+    # Batch validation grades several queries at once without touching the single authoring session
+    BATCH: workload_pool_config(BATCH, 0, 4, 0, lends=False, max_wait=30.0),
+}
+ASYNC_WORKLOADS = (PLAYGROUND, GRADING)
+
+oracle_pools = {}
+oracle_async_pools = {}
+# Sync and async pools of a workload share one gate, together they never hold more than its max sessions
+oracle_admissions = {
+    workload: AdmissionGate(settings["max"], settings["queue_depth"], settings["max_wait"])
+    for workload, settings in WORKLOAD_POOLS.items()
+}
+
+DATASET_VERSION = config("ORACLE_DATASET_VERSION", default="1")
+
+DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+DATETIME_TYPES = (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP, oracledb.DB_TYPE_TIMESTAMP_TZ,
+                  oracledb.DB_TYPE_TIMESTAMP_LTZ)
+BINARY_TYPES = (oracledb.DB_TYPE_RAW, oracledb.DB_TYPE_LONG_RAW, oracledb.DB_TYPE_BLOB)
+
+
+def format_datetime(value):
+    return value.strftime(DATETIME_FORMAT)
+
+
+def output_type_handler(cursor: oracledb.Cursor, metadata):
+    # NUMBER is already fetched as int/float, so only the types JSON can't carry are converted here
+    if metadata.type_code in DATETIME_TYPES:
+        return cursor.var(metadata.type_code, arraysize=cursor.arraysize, outconverter=format_datetime)
+    if metadata.type_code is oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_NCLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_NVARCHAR, arraysize=cursor.arraysize)
+    if metadata.type_code in BINARY_TYPES:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize, outconverter=bytes.hex)
+    if metadata.type_code is oracledb.DB_TYPE_INTERVAL_DS:
+        return cursor.var(metadata.type_code, arraysize=cursor.arraysize, outconverter=str)
+    return None
+
 def init_oracle_session(conn: oracledb.Connection, requestedTag: str):
     with conn.cursor() as cursor:
         try:
@@ -23,44 +126,289 @@ def init_oracle_session(conn: oracledb.Connection, requestedTag: str):
         except oracledb.DatabaseError as e:
             print(f"FAILED to set session parameters: {e}")
 
+async def init_oracle_session_async(conn: oracledb.AsyncConnection, requestedTag: str):
+    with conn.cursor() as cursor:
+        try:
+            await cursor.execute("ALTER SESSION SET NLS_DATE_LANGUAGE = 'AMERICAN'")
+        except oracledb.DatabaseError as e:
+            print(f"FAILED to set session parameters: {e}")
+
+
+def pool_params(settings: dict) -> dict:
+    params = {
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "dsn": DSN,
+        "min": settings["min"],
+        "max": settings["max"],
+        "increment": ORACLE_POOL_INCREMENT,
+        "getmode": oracledb.POOL_GETMODE_TIMEDWAIT,
+        "wait_timeout": settings["wait_timeout"],
+        "max_lifetime_session": ORACLE_POOL_MAX_LIFETIME_SESSION,
+    }
+    if settings.get("idle_timeout"):
+        params["timeout"] = settings["idle_timeout"]
+    if ORACLE_SYSDBA:
+        params["mode"] = oracledb.AuthMode.SYSDBA
+    if ORACLE_DRCP:
+        # Workers keep a thin client-side pool, sessions come from the database resident pool
+        params["server_type"] = "pooled"
+        params["cclass"] = ORACLE_DRCP_CCLASS
+        params["purity"] = DRCP_PURITIES[ORACLE_DRCP_PURITY]
+    return params
+
+
+def sync_pool_settings(workload: str) -> dict:
+    settings = WORKLOAD_POOLS[workload]
+    if ORACLE_ASYNC and workload in ASYNC_WORKLOADS:
+        # Requests go through the async pool, this one only opens sessions for background work and hands them back
+        return {**settings, "min": 0, "idle_timeout": ORACLE_POOL_IDLE_TIMEOUT}
+    return settings
+
+
 def create_oracle_pool():
-    global oracle_pool
-    try:
-        oracle_pool = oracledb.create_pool(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dsn=DSN,
-            mode=oracledb.AuthMode.SYSDBA,
-            min=2,
-            max=5,
-            session_callback=init_oracle_session
+    for workload in WORKLOAD_POOLS:
+        try:
+            oracle_pools[workload] = oracledb.create_pool(**pool_params(sync_pool_settings(workload)),
+                                                          session_callback=init_oracle_session)
+            print(f"Oracle Connection Pool '{workload}' successfully created!")
+        except oracledb.DatabaseError as e:
+            print(f"FATAL: Couldn't create connection pool '{workload}': {e}")
+            oracle_pools.pop(workload, None)
+
+def create_oracle_pool_async():
+    for workload in ASYNC_WORKLOADS:
+        try:
+            oracle_async_pools[workload] = oracledb.create_pool_async(**pool_params(WORKLOAD_POOLS[workload]),
+                                                                      session_callback=init_oracle_session_async)
+            print(f"Oracle async Connection Pool '{workload}' successfully created!")
+        except oracledb.DatabaseError as e:
+            print(f"FATAL: Couldn't create async connection pool '{workload}': {e}")
+            oracle_async_pools.pop(workload, None)
+
+
+async def close_oracle_pool_async():
+    for workload in list(oracle_async_pools):
+        await oracle_async_pools.pop(workload).close()
+        print(f"Oracle async Connection Pool '{workload}' closed!")
+
+
+def close_oracle_pool():
+    for workload in list(oracle_pools):
+        oracle_pools.pop(workload).close()
+        print(f"Oracle Connection Pool '{workload}' closed!")
+
+
+def pool_busy_exception() -> AppException:
+    return AppException(ErrorCodes.ORACLE_POOL_BUSY, 429, headers={"Retry-After": str(ORACLE_RETRY_AFTER)})
+
+
+def is_call_timeout(error) -> bool:
+    return error.full_code in CALL_TIMEOUT_ERRORS
+
+
+def lenders(workload: str) -> list:
+    priority = WORKLOAD_POOLS[workload]["priority"]
+    others = [other for other, settings in WORKLOAD_POOLS.items()
+              if settings["priority"] < priority and settings["lends"]]
+    return sorted(others, key=lambda other: WORKLOAD_POOLS[other]["priority"], reverse=True)
+
+
+def admit(workload: str, key=None) -> str:
+    """Returns the workload whose pool serves the request, borrowing idle capacity from lower priorities first."""
+    if oracle_admissions[workload].try_acquire():
+        return workload
+
+    if ORACLE_POOL_BORROW:
+        for lender in lenders(workload):
+            if lender in oracle_pools and oracle_admissions[lender].try_acquire():
+                counters.increment(f"pool_borrowed.{workload}.{lender}")
+                return lender
+
+    if not oracle_admissions[workload].acquire(key):
+        raise pool_busy_exception()
+    return workload
+
+
+def acquire_oracle_conn(workload: str, key=None) -> Generator[oracledb.Connection, None, None]:
+    if workload not in oracle_pools:
+        raise HTTPException(
+            status_code=503,
+            detail="Oracle connection pool is closed",
         )
-        print("Oracle Connection Pool successfully created!")
+
+    source = admit(workload, key)
+    conn = None
+    timed_out = False
+    try:
+        try:
+            conn = oracle_pools[source].acquire()
+        except (oracledb.DatabaseError, KeyError):
+            raise pool_busy_exception()
+        conn.outputtypehandler = output_type_handler
+        conn.call_timeout = CALL_TIMEOUTS_MS[workload]
+        yield conn
+    except AppException as e:
+        if e.message == ErrorCodes.QUERY_TIMEOUT and not e.shared:
+            timed_out = True
+            counters.increment(f"call_timeouts.{workload}")
+        raise
     except oracledb.DatabaseError as e:
-        print(f"FATAL: Couldn't create connection pool: {e}")
-        oracle_pool = None
+        error, = e.args
+        raise HTTPException(status_code=500, detail=f"Connection error Oracle: {error.message.strip()}")
+    finally:
+        if conn:
+            release_conn(source, conn, drop=timed_out)
+        oracle_admissions[source].release()
 
-def close_oracle_pool():
-    global oracle_pool
-    if oracle_pool:
-        oracle_pool.close()
-        print("Oracle Connection Pool closed!")
+
+def release_conn(workload: str, conn: oracledb.Connection, drop: bool = False):
+    pool = oracle_pools.get(workload)
+    if pool is None:
+        return
+    if drop:
+        pool.drop(conn)
+        return
+    conn.call_timeout = 0
+    pool.release(conn)
+
+
+def get_playground_conn(user_data=Depends(get_current_user)) -> Generator[oracledb.Connection, None, None]:
+    yield from acquire_oracle_conn(PLAYGROUND, user_data["id"])
+
+
+def get_grading_conn(user_data=Depends(get_current_user)) -> Generator[oracledb.Connection, None, None]:
+    yield from acquire_oracle_conn(GRADING, user_data["id"])
+
+
+def get_authoring_conn() -> Generator[oracledb.Connection, None, None]:
+    yield from acquire_oracle_conn(AUTHORING)
+
+
+# Same admission and timeout handling for work that runs outside a request
+oracle_conn_context = contextmanager(acquire_oracle_conn)
 
 
-def get_oracle_conn() -> Generator[oracledb.Connection, None, None]:
-    if oracle_pool is None:
+async def admit_async(workload: str, key=None) -> str:
+    if oracle_admissions[workload].try_acquire():
+        return workload
+
+    if ORACLE_POOL_BORROW:
+        for lender in lenders(workload):
+            if lender in oracle_async_pools and oracle_admissions[lender].try_acquire():
+                counters.increment(f"pool_borrowed.{workload}.{lender}")
+                return lender
+
+    # Waiting coroutines hold no thread and are admitted round-robin by key like the sync path
+    if not await oracle_admissions[workload].acquire_async(key):
+        raise pool_busy_exception()
+    return workload
+
+
+@asynccontextmanager
+async def acquire_oracle_conn_async(workload: str, key=None) -> AsyncGenerator[oracledb.AsyncConnection, None]:
+    if workload not in oracle_async_pools:
         raise HTTPException(
             status_code=503,
             detail="Oracle connection pool is closed",
         )
 
+    source = await admit_async(workload, key)
     conn = None
+    timed_out = False
     try:
-        conn = oracle_pool.acquire()
+        try:
+            conn = await oracle_async_pools[source].acquire()
+        except (oracledb.DatabaseError, KeyError):
+            raise pool_busy_exception()
+        conn.outputtypehandler = output_type_handler
+        conn.call_timeout = CALL_TIMEOUTS_MS[workload]
         yield conn
+    except AppException as e:
+        if e.message == ErrorCodes.QUERY_TIMEOUT and not e.shared:
+            timed_out = True
+            counters.increment(f"call_timeouts.{workload}")
+        raise
     except oracledb.DatabaseError as e:
         error, = e.args
         raise HTTPException(status_code=500, detail=f"Connection error Oracle: {error.message.strip()}")
     finally:
         if conn:
-            oracle_pool.release(conn)
\ No newline at end of file
+            await release_conn_async(source, conn, drop=timed_out)
+        oracle_admissions[source].release()
+
+
+async def release_conn_async(workload: str, conn: oracledb.AsyncConnection, drop: bool = False):
+    pool = oracle_async_pools.get(workload)
+    if pool is None:
+        return
+    if drop:
+        await pool.drop(conn)
+        return
+    conn.call_timeout = 0
+    await pool.release(conn)
+
+
+async def get_playground_conn_async(user_data=Depends(get_current_user)) -> AsyncGenerator[oracledb.AsyncConnection,
+                                                                                            None]:
+    async with acquire_oracle_conn_async(PLAYGROUND, user_data["id"]) as conn:
+        yield conn
+
+
+async def get_grading_conn_async(user_data=Depends(get_current_user)) -> AsyncGenerator[oracledb.AsyncConnection,
+                                                                                         None]:
+    async with acquire_oracle_conn_async(GRADING, user_data["id"]) as conn:
+        yield conn
+
+
+def acquire_spare_conn(workload: str, call_timeout: int = 0) -> oracledb.Connection | None:
+    pool = oracle_pools.get(workload)
+    if pool is None or not oracle_admissions[workload].try_acquire():
+        return None
+    try:
+        conn = pool.acquire()
+    except oracledb.DatabaseError:
+        oracle_admissions[workload].release()
+        return None
+    conn.outputtypehandler = output_type_handler
+    conn.call_timeout = call_timeout
+    return conn
+
+
+def release_spare_conn(workload: str, conn: oracledb.Connection, drop: bool = False):
+    release_conn(workload, conn, drop=drop)
+    oracle_admissions[workload].release()
+
+
+def pool_stats(pool) -> dict | None:
+    if pool is None:
+        return None
+    return {
+        "busy": pool.busy,
+        "opened": pool.opened,
+        "min": pool.min,
+        "max": pool.max,
+        "utilization": round(pool.busy / pool.max, 3) if pool.max else 0,
+    }
+
+
+def get_oracle_pool_stats():
+    workloads = {}
+    for workload, settings in WORKLOAD_POOLS.items():
+        workloads[workload] = {
+            "priority": settings["priority"],
+            "lends": settings["lends"],
+            "wait_timeout": settings["wait_timeout"],
+            "pool": pool_stats(oracle_pools.get(workload)),
+            "admission": oracle_admissions[workload].stats(),
+        }
+        if workload in ASYNC_WORKLOADS:
+            workloads[workload]["async_pool"] = pool_stats(oracle_async_pools.get(workload))
+
+    return {
+        "workloads": workloads,
+        "borrowing": ORACLE_POOL_BORROW,
+        "max_lifetime_session": ORACLE_POOL_MAX_LIFETIME_SESSION,
+        "drcp": {"cclass": ORACLE_DRCP_CCLASS, "purity": ORACLE_DRCP_PURITY} if ORACLE_DRCP else None,
+        "counters": counters.snapshot(),
+    }
@@ -46,6 +46,10 @@ def update_exercise_db(exercise: Exercise, db: Session):
     return saved_exercise
 
 
+def get_all_exercises_db(db: Session):
+    return db.query(Exercise).all()
+
+
 def get_exercises_total_db(db: Session):
     return db.query(Exercise).count()
 
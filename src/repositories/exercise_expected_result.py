@@ -0,0 +1,51 @@
+import datetime
+
+from sqlalchemy.orm import Session
+
+from src.models.exercise_expected_result import ExerciseExpectedResult
+
+
+def find_expected_result_by_exercise_id(exercise_id, db: Session) -> ExerciseExpectedResult | None:
+    return db.query(ExerciseExpectedResult).filter(ExerciseExpectedResult.exercise_id == exercise_id).first()
+
+
+def save_expected_result_db(db: Session, exercise_id, expected_result: dict,
+                            dataset_version: str) -> ExerciseExpectedResult:
+    stored_result = find_expected_result_by_exercise_id(exercise_id, db)
+    if stored_result is None:
+        stored_result = ExerciseExpectedResult(
+            exercise_id=exercise_id,
+            created_at=datetime.datetime.now(datetime.UTC),
+        )
+
+    stored_result.columns = expected_result["columns"]
+    stored_result.rows = expected_result["rows"]
+    stored_result.row_count = expected_result["row_count"]
+    stored_result.has_order = expected_result["has_order"]
+    stored_result.is_dml = expected_result["is_dml"]
+    stored_result.is_delta = expected_result["is_delta"]
+    stored_result.target_table = expected_result["target_table"]
+    stored_result.dataset_version = dataset_version
+    stored_result.version = (stored_result.version or 0) + 1
+    stored_result.updated_at = datetime.datetime.now(datetime.UTC)
+    return save_expected_result(stored_result, db)
+
+
+def expected_result_to_dict(stored_result: ExerciseExpectedResult) -> dict:
+    return {
+        "columns": stored_result.columns,
+        "rows": stored_result.rows,
+        "row_count": stored_result.row_count,
+        "has_order": stored_result.has_order,
+        "is_dml": stored_result.is_dml,
+        "is_delta": bool(stored_result.is_delta),
+        "target_table": stored_result.target_table,
+        "version": stored_result.version,
+    }
+
+
+def save_expected_result(expected_result: ExerciseExpectedResult, db: Session):
+    db.add(expected_result)
+    db.commit()
+    db.refresh(expected_result)
+    return expected_result
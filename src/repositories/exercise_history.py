@@ -1,11 +1,13 @@
 import datetime
-import decimal
+import uuid
 from uuid import UUID
 
+from sqlalchemy import or_, update
 from sqlalchemy.orm import Session
 
 from src.models import User, Laboratory, Exercise
-from src.models.exercise_history import ExerciseHistory
+from src.models.exercise_history import ExerciseHistory, PENDING, RUNNING, DONE, FAILED
+from src.models.exercise_verdict import ExerciseVerdict
 from src.schemas.exercise import ExerciseSchemaOut
 from src.schemas.exercise_history import CreateExerciseHistorySchema, UserScoreHistorySchemaOut, \
     ExerciseHistorySchemaOut
@@ -40,7 +42,8 @@ def get_exercise_history_by_user_db(db: Session, user_id: str):
 
 
 def add_exercise_history_to_db(db: Session, user_id: UUID, validation_result: dict,
-                               request: CreateExerciseHistorySchema) -> ExerciseHistory | None:
+                               request: CreateExerciseHistorySchema,
+                               verdict: ExerciseVerdict | None = None) -> ExerciseHistory | None:
     success = validation_result['validation']['status'] == 'success'
     new_exercise_history = ExerciseHistory(
         response=request.response,
@@ -49,12 +52,110 @@ def add_exercise_history_to_db(db: Session, user_id: UUID, validation_result: di
         exercise_id=request.exercise_id,
         laboratory_id=request.laboratory_id,
         created_at=datetime.datetime.now(datetime.UTC),
-        result_details=validation_result['validation'],
+        stored_result_details=None if verdict else validation_result['validation'],
+        verdict_id=verdict.id if verdict else None,
     )
     saved_exercise_history = save_exercise_history(new_exercise_history, db)
     return saved_exercise_history
 
 
+def add_pending_exercise_history_db(db: Session, user_id: UUID,
+                                    request: CreateExerciseHistorySchema) -> ExerciseHistory:
+    new_exercise_history = ExerciseHistory(
+        response=request.response,
+        user_id=user_id,
+        exercise_id=request.exercise_id,
+        laboratory_id=request.laboratory_id,
+        created_at=datetime.datetime.now(datetime.UTC),
+        status=PENDING,
+    )
+    return save_exercise_history(new_exercise_history, db)
+
+
+def find_exercise_history_by_id(db: Session, history_id) -> ExerciseHistory | None:
+    return db.query(ExerciseHistory).filter(ExerciseHistory.id == history_id).first()
+
+
+def claim_exercise_history_db(db: Session, history_id) -> UUID | None:
+    # Only one worker moves a submission out of pending, duplicate queue entries are skipped
+    lease_id = uuid.uuid4()
+    claimed = db.query(ExerciseHistory).filter(
+        ExerciseHistory.id == history_id,
+        ExerciseHistory.status == PENDING,
+    ).update({
+        ExerciseHistory.status: RUNNING,
+        ExerciseHistory.lease_id: lease_id,
+        ExerciseHistory.leased_at: datetime.datetime.now(datetime.UTC),
+    }, synchronize_session=False)
+    db.commit()
+    return lease_id if claimed == 1 else None
+
+
+def leased_history_query(db: Session, history_id, lease_id):
+    return db.query(ExerciseHistory).filter(ExerciseHistory.id == history_id, ExerciseHistory.status == RUNNING,
+                                            ExerciseHistory.lease_id == lease_id)
+
+
+def release_exercise_history_db(db: Session, history_id, lease_id) -> bool:
+    released = leased_history_query(db, history_id, lease_id).update(
+        {ExerciseHistory.status: PENDING, ExerciseHistory.lease_id: None}, synchronize_session=False)
+    db.commit()
+    return bool(released)
+
+
+def finish_leased_history_db(db: Session, history_id, lease_id, values: dict) -> bool:
+    """Stores a graded submission, or returns False once its lease went to another worker."""
+    finished = leased_history_query(db, history_id, lease_id).update(
+        {**values, ExerciseHistory.lease_id: None}, synchronize_session=False)
+    db.commit()
+    return bool(finished)
+
+
+def complete_leased_history_db(db: Session, history_id, lease_id, validation_result: dict,
+                               verdict: ExerciseVerdict | None = None) -> bool:
+    return finish_leased_history_db(db, history_id, lease_id, {
+        ExerciseHistory.success: validation_result['validation']['status'] == 'success',
+        ExerciseHistory.stored_result_details: None if verdict else validation_result['validation'],
+        ExerciseHistory.verdict_id: verdict.id if verdict else None,
+        ExerciseHistory.status: DONE,
+    })
+
+
+def fail_leased_history_db(db: Session, history_id, lease_id, code: str) -> bool:
+    return finish_leased_history_db(db, history_id, lease_id, {
+        ExerciseHistory.success: False,
+        ExerciseHistory.stored_result_details: {"status": "error", "message": code},
+        ExerciseHistory.status: FAILED,
+    })
+
+
+def fail_exercise_history_db(db: Session, exercise_history: ExerciseHistory, code: str) -> ExerciseHistory:
+    exercise_history.success = False
+    exercise_history.stored_result_details = {"status": "error", "message": code}
+    exercise_history.status = FAILED
+    return save_exercise_history(exercise_history, db)
+
+
+def get_pending_exercise_history_ids_db(db: Session) -> list:
+    rows = db.query(ExerciseHistory.id).filter(ExerciseHistory.status == PENDING).order_by(
+        ExerciseHistory.created_at).all()
+    return [str(row.id) for row in rows]
+
+
+def reset_stale_exercise_history_db(db: Session, lease_seconds: int) -> list:
+    """Moves submissions whose worker outlived its lease back to pending and returns their ids.
+
+    The update hands every stale row to a single caller, however many processes sweep at once.
+    """
+    cutoff = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=lease_seconds)
+    rows = db.execute(update(ExerciseHistory).where(
+        ExerciseHistory.status == RUNNING,
+        or_(ExerciseHistory.leased_at.is_(None), ExerciseHistory.leased_at < cutoff),
+    ).values({ExerciseHistory.status: PENDING, ExerciseHistory.lease_id: None}).returning(ExerciseHistory.id)).all()
+    db.commit()
+    return [str(row.id) for row in rows]
+
+
 def get_exercises_scoreboard_db(db: Session):
     users = db.query(User).filter(User.role == 0).all()
     users_scores = []
@@ -94,23 +195,6 @@ def get_laboratories_scoreboard_db(db: Session):
     return users_scores
 
 
-def make_dict_json_serializable(data):
-    if isinstance(data, dict):
-        return {key: make_dict_json_serializable(value) for key, value in data.items()}
-
-    elif isinstance(data, list):
-        return [make_dict_json_serializable(item) for item in data]
-
-    elif isinstance(data, (datetime.date, datetime.datetime)):
-        return data.strftime("%d/%m/%Y %H:%M:%S")
-
-    elif isinstance(data, decimal.Decimal):
-        return str(data)
-
-    else:
-        return data
-
-
 def get_exercises_stats_db(db: Session):
     exercises = get_exercises_with_names_attached(db)
     if exercises:
@@ -0,0 +1,55 @@
+import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models.exercise_history import ExerciseHistory
+from src.models.exercise_verdict import ExerciseVerdict
+
+
+def find_verdict(db: Session, exercise_id, exercise_version: int, sql_hash: str) -> ExerciseVerdict | None:
+    return db.query(ExerciseVerdict).filter(
+        ExerciseVerdict.exercise_id == exercise_id,
+        ExerciseVerdict.exercise_version == exercise_version,
+        ExerciseVerdict.sql_hash == sql_hash,
+    ).first()
+
+
+def record_verdict_hit(db: Session, verdict: ExerciseVerdict):
+    db.query(ExerciseVerdict).filter(ExerciseVerdict.id == verdict.id).update(
+        {ExerciseVerdict.hits: ExerciseVerdict.hits + 1}, synchronize_session=False)
+    db.commit()
+
+
+def save_verdict_db(db: Session, exercise_id, exercise_version: int, sql_hash: str,
+                    validation: dict) -> ExerciseVerdict:
+    verdict = ExerciseVerdict(
+        exercise_id=exercise_id,
+        exercise_version=exercise_version,
+        sql_hash=sql_hash,
+        success=validation["status"] == "success",
+        validation=validation,
+        hits=0,
+        created_at=datetime.datetime.now(datetime.UTC),
+    )
+    db.add(verdict)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker graded the same submission first
+        db.rollback()
+        return find_verdict(db, exercise_id, exercise_version, sql_hash)
+    db.refresh(verdict)
+    return verdict
+
+
+def detach_verdicts_db(db: Session, exercise_ids: list):
+    """Copies each verdict into the submissions that share it, so the verdicts can go with their exercises.
+
+    Leaves the commit to the caller's delete.
+    """
+    for verdict in db.query(ExerciseVerdict).filter(ExerciseVerdict.exercise_id.in_(exercise_ids)).all():
+        db.query(ExerciseHistory).filter(ExerciseHistory.verdict_id == verdict.id).update({
+            ExerciseHistory.stored_result_details: verdict.result_details,
+            ExerciseHistory.verdict_id: None,
+        }, synchronize_session=False)
@@ -0,0 +1,127 @@
+import datetime
+import uuid
+
+from sqlalchemy import or_, and_, update
+from sqlalchemy.orm import Session
+
+from src.models.exercise_history import ExerciseHistory, DONE as HISTORY_DONE
+from src.models.regrade_job import RegradeJob, PENDING, RUNNING, SUPERSEDED
+
+
+def create_regrade_job_db(db: Session, exercise_id) -> RegradeJob:
+    now = datetime.datetime.now(datetime.UTC)
+    # Rows graded against an older solution are regraded again by the new job anyway
+    db.query(RegradeJob).filter(
+        RegradeJob.exercise_id == exercise_id,
+        RegradeJob.status.in_((PENDING, RUNNING)),
+    ).update({RegradeJob.status: SUPERSEDED, RegradeJob.finished_at: now}, synchronize_session=False)
+
+    job = RegradeJob(exercise_id=exercise_id, status=PENDING, created_at=now)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def find_regrade_job_by_id(db: Session, job_id) -> RegradeJob | None:
+    return db.query(RegradeJob).filter(RegradeJob.id == job_id).first()
+
+
+def get_regrade_jobs_db(db: Session, limit: int = 50) -> list:
+    return db.query(RegradeJob).order_by(RegradeJob.created_at.desc()).limit(limit).all()
+
+
+def claim_regrade_job_db(db: Session, lease_seconds: int) -> RegradeJob | None:
+    now = datetime.datetime.now(datetime.UTC)
+    cutoff = now - datetime.timedelta(seconds=lease_seconds)
+    # Running jobs whose heartbeat stopped belong to a process that died, they resume from their cursor
+    job = db.query(RegradeJob).filter(or_(
+        RegradeJob.status == PENDING,
+        and_(RegradeJob.status == RUNNING, or_(RegradeJob.heartbeat_at.is_(None), RegradeJob.heartbeat_at < cutoff)),
+    )).order_by(RegradeJob.created_at).with_for_update(skip_locked=True).first()
+    if job is None:
+        db.commit()
+        return None
+
+    # A new lease fences off a previous holder that is still running but stopped heartbeating in time
+    job.status = RUNNING
+    job.lease_id = uuid.uuid4()
+    job.started_at = job.started_at or now
+    job.heartbeat_at = now
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def regrade_rows_query(db: Session, exercise_id):
+    return db.query(ExerciseHistory.id, ExerciseHistory.response, ExerciseHistory.success).filter(
+        ExerciseHistory.exercise_id == exercise_id,
+        or_(ExerciseHistory.status == HISTORY_DONE, ExerciseHistory.status.is_(None)),
+    )
+
+
+def count_regrade_rows_db(db: Session, exercise_id) -> int:
+    return regrade_rows_query(db, exercise_id).count()
+
+
+def leased_job_query(db: Session, job_id, lease_id):
+    return db.query(RegradeJob).filter(RegradeJob.id == job_id, RegradeJob.status == RUNNING,
+                                       RegradeJob.lease_id == lease_id)
+
+
+def set_regrade_total_db(db: Session, job_id, lease_id, total: int):
+    leased_job_query(db, job_id, lease_id).update({RegradeJob.total: total}, synchronize_session=False)
+    db.commit()
+
+
+def get_regrade_chunk_db(db: Session, exercise_id, after_id, limit: int) -> list:
+    query = regrade_rows_query(db, exercise_id)
+    if after_id is not None:
+        query = query.filter(ExerciseHistory.id > after_id)
+    return query.order_by(ExerciseHistory.id).limit(limit).all()
+
+
+def save_regrade_chunk_db(db: Session, job_id, lease_id, updates: list, processed: int, changed: int, errors: int,
+                          last_history_id) -> bool:
+    """Writes a chunk's verdicts and advances the job cursor in one transaction.
+
+    Returns False without writing anything once the job is no longer running under this lease.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    advanced = leased_job_query(db, job_id, lease_id).update({
+        RegradeJob.processed: RegradeJob.processed + processed,
+        RegradeJob.changed: RegradeJob.changed + changed,
+        RegradeJob.errors: RegradeJob.errors + errors,
+        RegradeJob.last_history_id: last_history_id,
+        RegradeJob.heartbeat_at: now,
+    }, synchronize_session=False)
+    if not advanced:
+        db.rollback()
+        return False
+
+    if updates:
+        db.execute(update(ExerciseHistory), updates)
+    db.commit()
+    return True
+
+
+def touch_regrade_job_db(db: Session, job_id, lease_id) -> bool:
+    touched = leased_job_query(db, job_id, lease_id).update(
+        {RegradeJob.heartbeat_at: datetime.datetime.now(datetime.UTC)}, synchronize_session=False)
+    db.commit()
+    return bool(touched)
+
+
+def finish_regrade_job_db(db: Session, job_id, lease_id, status: str, error: str | None = None):
+    leased_job_query(db, job_id, lease_id).update({
+        RegradeJob.status: status,
+        RegradeJob.error: error,
+        RegradeJob.finished_at: datetime.datetime.now(datetime.UTC),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def release_regrade_job_db(db: Session, job_id, lease_id):
+    leased_job_query(db, job_id, lease_id).update({RegradeJob.status: PENDING, RegradeJob.lease_id: None},
+                                                  synchronize_session=False)
+    db.commit()
@@ -1,4 +1,5 @@
 from typing import Annotated
+from uuid import UUID
 
 from fastapi import Depends, APIRouter
 from sqlalchemy.orm import Session
@@ -6,7 +7,14 @@ from starlette import status
 from starlette.responses import Response
 
 from src.database import get_db
-from src.dependencies import is_admin, get_current_user, is_super_admin
+from src.dependencies import is_admin, get_current_user, is_super_admin, rate_limiter
+from src.oracle_db import get_oracle_pool_stats
+from src.services.grading_jobs import grading_queue_stats
+from src.services.query_parse import parse_cache
+from src.services.query_plan import plan_cache
+from src.services.regrade import schedule_regrade, get_regrade_job, get_regrade_jobs
+from src.services.result_cache import result_cache
+from src.utils.single_flight import single_flight
 from src.schemas.user import UserOut, UsersPaginatedRequest, UsersPaginatedOut
 from src.services.user import get_all_users, delete_user_by_id, get_all_users_paginated, promote_user_admin, \
     demote_user_admin
@@ -65,4 +73,46 @@ def demote_user_endpoint(
         admin: bool = Depends(is_super_admin),
 ):
     response = demote_user_admin(user_id, db)
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@admin_router.get("/oracle/stats", status_code=status.HTTP_200_OK)
+def get_oracle_stats_endpoint(
+        admin: bool = Depends(is_admin),
+):
+    return ok({**get_oracle_pool_stats(),
+               "plan_cache": plan_cache.stats(),
+               "parse_cache": parse_cache.stats(),
+               "result_cache": result_cache.stats(),
+               "single_flight": single_flight.stats(),
+               "grading_queue": grading_queue_stats(),
+               "rate_limiter": rate_limiter.stats()}, 200)
+
+
+@admin_router.post("/regrade/{exercise_id}", status_code=status.HTTP_202_ACCEPTED)
+def regrade_exercise_endpoint(
+        db: db_dependency,
+        exercise_id: str,
+        admin: bool = Depends(is_admin),
+):
+    response = schedule_regrade(db, exercise_id)
+    return ok(response, 202)
+
+
+@admin_router.get("/regrade-jobs", status_code=status.HTTP_200_OK)
+def get_regrade_jobs_endpoint(
+        db: db_dependency,
+        admin: bool = Depends(is_admin),
+):
+    response = get_regrade_jobs(db)
+    return ok(response, 200)
+
+
+@admin_router.get("/regrade-jobs/{job_id}", status_code=status.HTTP_200_OK)
+def get_regrade_job_endpoint(
+        db: db_dependency,
+        job_id: UUID,
+        admin: bool = Depends(is_admin),
+):
+    response = get_regrade_job(db, str(job_id))
+    return ok(response, 200)
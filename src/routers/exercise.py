@@ -8,16 +8,17 @@ from starlette.responses import Response
 
 from src.database import get_db
 from src.dependencies import is_admin, get_current_user
-from src.oracle_db import get_oracle_conn
+from src.oracle_db import get_authoring_conn
 from src.schemas.exercise import CreateExerciseSchema, ExerciseSchemaOut, UpdateExerciseSchema
 from src.services.exercise import add_exercise, get_exercises, delete_exercise_by_id, update_exercise, \
-    get_exercises_total
+    get_exercises_total, refresh_all_expected_results
+from src.services.regrade import queue_regrade
 from src.utils.responses import ok
 
 exercise_router = APIRouter(prefix="/api/v1/exercise", tags=["exercise"])
 
 db_dependency = Annotated[Session, Depends(get_db)]
-oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_oracle_conn)]
+oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_authoring_conn)]
 
 
 @exercise_router.post("/", status_code=status.HTTP_201_CREATED)
@@ -33,6 +34,16 @@ def add_exercise_endpoint(
     return ok(data, 201)
 
 
+@exercise_router.post("/expected-results/refresh", status_code=status.HTTP_200_OK)
+def refresh_expected_results_endpoint(
+        db: db_dependency,
+        oracle_conn: oracle_conn_dependency,
+        admin: bool = Depends(is_admin)
+):
+    response = refresh_all_expected_results(db, oracle_conn)
+    return ok(response, 200)
+
+
 @exercise_router.get("/by-laboratory/{laboratory_id}", status_code=status.HTTP_200_OK)
 def get_exercises_endpoint(
         db: db_dependency,
@@ -52,7 +63,9 @@ def update_exercise_endpoint(
         db: db_dependency,
         admin: bool = Depends(is_admin)
 ):
-    response = update_exercise(updated_exercise, oracle_conn, exercise_id, db)
+    response, solution_changed = update_exercise(updated_exercise, oracle_conn, exercise_id, db)
+    if solution_changed:
+        queue_regrade(db, response.id)
     return ok(ExerciseSchemaOut.model_validate(response, from_attributes=True).model_dump(), 200)
 
 
@@ -1,22 +1,31 @@
 from typing import Annotated
+from uuid import UUID
 
 import oracledb
 from fastapi import Depends, APIRouter
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 from src.database import get_db
-from src.dependencies import get_current_user, is_admin
-from src.oracle_db import get_oracle_conn
+from src.dependencies import get_current_user, is_admin, rate_limit
+from src.oracle_db import get_grading_conn, get_grading_conn_async, ORACLE_ASYNC
 from src.schemas.exercise_history import CreateExerciseHistorySchema, ExerciseHistorySchemaOut
 from src.services.exercise_history import get_exercise_history, add_exercise_history, get_exercises_scoreboard, \
-    get_laboratories_scoreboard, get_exercise_history_by_user, get_exercises_stats, get_only_failed_exercises_stats
+    get_laboratories_scoreboard, get_exercise_history_by_user, get_exercises_stats, get_only_failed_exercises_stats, \
+    add_exercise_history_async
+from src.services.grading_jobs import GRADING_QUEUE, enqueue_submission, get_job, get_job_snapshot, job_events
 from src.utils.responses import ok
 
 exercise_history_router = APIRouter(prefix="/api/v1/exercise_history", tags=["exercise_history"])
 
 db_dependency = Annotated[Session, Depends(get_db)]
-oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_oracle_conn)]
+submit_user_dependency = Annotated[dict, Depends(rate_limit("submit"))]
+if ORACLE_ASYNC:
+    oracle_conn_dependency = Annotated[oracledb.AsyncConnection, Depends(get_grading_conn_async)]
+else:
+    oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_grading_conn)]
 
 
 @exercise_history_router.get("/by-exercise/{exercise_id}", status_code=status.HTTP_200_OK)
@@ -50,17 +59,52 @@ def get_exercises_by_user_id_endpoint(
     return ok(data, 200)
 
 
-@exercise_history_router.post("/", status_code=status.HTTP_201_CREATED)
-def add_exercise_history_endpoint(
+if GRADING_QUEUE:
+    @exercise_history_router.post("/", status_code=status.HTTP_202_ACCEPTED)
+    def add_exercise_history_endpoint(
+            user_data: submit_user_dependency,
+            db: db_dependency,
+            request: CreateExerciseHistorySchema,
+    ):
+        response = enqueue_submission(db, user_data["id"], request)
+        return ok(response, 202)
+else:
+    @exercise_history_router.post("/", status_code=status.HTTP_201_CREATED)
+    async def add_exercise_history_endpoint(
+            user_data: submit_user_dependency,
+            db: db_dependency,
+            oracle_db: oracle_conn_dependency,
+            request: CreateExerciseHistorySchema,
+    ):
+        if ORACLE_ASYNC:
+            saved_history, validation = await add_exercise_history_async(db, oracle_db, user_data["id"], request)
+        else:
+            saved_history, validation = await run_in_threadpool(add_exercise_history, db, oracle_db,
+                                                                user_data["id"], request)
+        saved_history.validation = validation.get("validation", {})
+        data = ExerciseHistorySchemaOut.model_validate(saved_history, from_attributes=True).model_dump()
+        return ok(data, 201)
+
+
+@exercise_history_router.get("/jobs/{job_id}", status_code=status.HTTP_200_OK)
+def get_grading_job_endpoint(
         db: db_dependency,
-        oracle_db: oracle_conn_dependency,
-        request: CreateExerciseHistorySchema,
+        job_id: UUID,
         user_data=Depends(get_current_user)
 ):
-    saved_history, validation = add_exercise_history(db, oracle_db, user_data["id"], request)
-    saved_history.validation = validation.get("validation", {})
-    data = ExerciseHistorySchemaOut.model_validate(saved_history, from_attributes=True).model_dump()
-    return ok(data, 201)
+    response = get_job(db, str(job_id), user_data)
+    return ok(response, 200)
+
+
+@exercise_history_router.get("/jobs/{job_id}/events", status_code=status.HTTP_200_OK)
+def get_grading_job_events_endpoint(
+        job_id: UUID,
+        user_data=Depends(get_current_user)
+):
+    # A short-lived session checks the job, the stream itself holds no connection between polls
+    get_job_snapshot(str(job_id), user_data)
+    return StreamingResponse(job_events(str(job_id), user_data), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @exercise_history_router.get("/status/{exercise_id}", status_code=status.HTTP_200_OK)
@@ -2,31 +2,102 @@ from typing import Annotated
 
 import oracledb
 from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
-from src.services.query_runner import run_query_match
-from src.dependencies import get_current_user
-from src.oracle_db import get_oracle_conn
-from src.schemas.query import QuerySchema, ValidateQuerySchema
-from src.services.query_runner import compare_queries
+from src.database import get_db
+from src.services.query_runner import run_query_match, run_select_page, run_explain_query
+from src.services.query_runner_async import run_query_match_async
+from src.dependencies import get_current_user, get_result_format, rate_limit, is_admin
+from src.oracle_db import get_playground_conn, get_grading_conn, get_playground_conn_async, get_grading_conn_async, \
+    ORACLE_ASYNC
+from src.schemas.query import QuerySchema, ValidateQuerySchema, QueryPageSchema, BatchValidateSchema
+from src.services.batch_validation import validate_batch
+from src.services.query_parse import parse_query
+from src.services.exercise_history import validate_query, validate_query_async
 from src.utils.responses import ok
+from src.utils.result_format import format_query_result, format_validation
 
 query_runner_router = APIRouter(prefix="/api/v1/runner", tags=["runner"])
-oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_oracle_conn)]
+db_dependency = Annotated[Session, Depends(get_db)]
+oracle_conn_dependency = Annotated[oracledb.Connection, Depends(get_playground_conn)]
+result_format_dependency = Annotated[str, Depends(get_result_format)]
+# Declared ahead of the connection so throttled requests never wait for Oracle
+run_user_dependency = Annotated[dict, Depends(rate_limit("run"))]
+validate_user_dependency = Annotated[dict, Depends(rate_limit("validate"))]
+batch_user_dependency = Annotated[dict, Depends(rate_limit("validate_batch"))]
+
+if ORACLE_ASYNC:
+    runner_conn_dependency = Annotated[oracledb.AsyncConnection, Depends(get_playground_conn_async)]
+    grading_conn_dependency = Annotated[oracledb.AsyncConnection, Depends(get_grading_conn_async)]
+else:
+    runner_conn_dependency = oracle_conn_dependency
+    grading_conn_dependency = Annotated[oracledb.Connection, Depends(get_grading_conn)]
 
 
 @query_runner_router.post("/")
-def run_query_endpoint(
+async def run_query_endpoint(
+        user_data: run_user_dependency,
+        db: runner_conn_dependency,
+        query: QuerySchema,
+        result_format: result_format_dependency):
+    if ORACLE_ASYNC:
+        result = await run_query_match_async(db, query)
+    else:
+        result = await run_in_threadpool(run_query_match, db, query)
+    return ok(format_query_result(result, result_format), status_code=200)
+
+
+@query_runner_router.post("/page")
+def run_query_page_endpoint(
+        db: oracle_conn_dependency,
+        page: QueryPageSchema,
+        result_format: result_format_dependency,
+        user_data=Depends(get_current_user)):
+    result = run_select_page(db, page)
+    return ok(format_query_result(result, result_format), status_code=200)
+
+
+@query_runner_router.post("/explain")
+def run_explain_endpoint(
         db: oracle_conn_dependency,
         query: QuerySchema,
+        result_format: result_format_dependency,
         user_data=Depends(get_current_user)):
-    result = run_query_match(db, query)
+    result = run_explain_query(db, query)
+    return ok(format_query_result(result, result_format), status_code=200)
+
+
+@query_runner_router.post("/parse")
+def run_parse_endpoint(
+        query: QuerySchema,
+        user_data=Depends(get_current_user)):
+    # Takes a connection from the parse budget only on a cache miss
+    result = parse_query(query, user_data["id"])
     return ok(result, status_code=200)
 
 
 @query_runner_router.post("/validate")
-def run_query_endpoint(
-        db: oracle_conn_dependency,
+async def run_query_endpoint(
+        user_data: validate_user_dependency,
+        db: grading_conn_dependency,
+        postgres_db: db_dependency,
         query: ValidateQuerySchema,
+        result_format: result_format_dependency,
 ):
-    result = compare_queries(db, query)
-    return ok(result, status_code=200)
+    if ORACLE_ASYNC:
+        result = await validate_query_async(postgres_db, db, query)
+    else:
+        result = await run_in_threadpool(validate_query, postgres_db, db, query)
+    return ok(format_validation(result, result_format), status_code=200)
+
+
+@query_runner_router.post("/validate/batch")
+def run_batch_validation_endpoint(
+        user_data: batch_user_dependency,
+        batch: BatchValidateSchema,
+        admin: bool = Depends(is_admin),
+):
+    lines = validate_batch(batch, user_data["id"])
+    return StreamingResponse(lines, media_type="application/x-ndjson")
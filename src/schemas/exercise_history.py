@@ -42,6 +42,7 @@ class ExerciseHistorySchemaOut(BaseModel):
     response: str = Field(default=None)
     created_at: datetime.datetime = Field(default=None)
     result_details: Dict[str, Any] = Field(default=None)
+    status: str = Field(default=None)
 
 class UserScoreHistorySchemaOut(BaseModel):
     model_config = ConfigDict(
@@ -1,3 +1,5 @@
+from uuid import UUID
+
 from pydantic import BaseModel, ConfigDict, Field
 
 
@@ -18,9 +20,41 @@ class ValidateQuerySchema(BaseModel):
             "examples": [{
                 "user_query": "SELECT * FROM students",
                 "correct_query": "SELECT * FROM students",
+                "exercise_id": "605adcfd-792b-4da2-be7e-43f805051480",
             }]
         }
     )
 
     user_query: str = Field()
     correct_query: str = Field()
+    exercise_id: UUID | None = Field(default=None)
+
+
+class QueryPageSchema(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [{
+                "query": "SELECT * FROM students",
+                "offset": 1000,
+                "limit": 1000,
+            }]
+        }
+    )
+
+    query: str = Field()
+    offset: int = Field(default=0, ge=0)
+    limit: int | None = Field(default=None, gt=0)
+
+
+class BatchValidateSchema(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [{
+                "exercise_id": "605adcfd-792b-4da2-be7e-43f805051480",
+                "user_queries": ["SELECT * FROM students", "SELECT nume FROM students"],
+            }]
+        }
+    )
+
+    exercise_id: UUID = Field()
+    user_queries: list[str] = Field(min_length=1)
@@ -0,0 +1,104 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
+
+from decouple import config
+
+from src.database import SessionLocal
+from src.exceptions.exceptions import AppException
+from src.oracle_db import oracle_conn_context, BATCH, WORKLOAD_POOLS
+from src.repositories.exercise import find_exercise_by_id
+from src.schemas.query import BatchValidateSchema
+from src.services.exercise import get_expected_result
+from src.services.exercise_history import grade_against_expected
+from src.utils.contants import ErrorCodes
+from src.utils.metrics import counters
+from src.utils.result_format import format_validation
+from src.utils.responses import dump_json
+from src.utils.sql_lexer import statement_hash
+
+# Batches have a pool of their own, they never take the sessions students grade on or the one authoring relies on
+BATCH_VALIDATION_WORKERS = config("BATCH_VALIDATION_WORKERS", default=WORKLOAD_POOLS[BATCH]["max"], cast=int)
+BATCH_VALIDATION_MAX_QUERIES = config("BATCH_VALIDATION_MAX_QUERIES", default=500, cast=int)
+
+# Shared by every batch, so concurrent batches together never grade more than this many queries at once
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_VALIDATION_WORKERS, thread_name_prefix="batch-validation")
+
+
+def validate_batch(batch: BatchValidateSchema, user_id) -> Iterator[bytes]:
+    if len(batch.user_queries) > BATCH_VALIDATION_MAX_QUERIES:
+        raise AppException(ErrorCodes.BATCH_TOO_LARGE, 400, details={"max_queries": BATCH_VALIDATION_MAX_QUERIES})
+
+    # The session is closed before streaming starts, every graded query opens its own for as long as it needs
+    db = SessionLocal()
+    try:
+        exercise = find_exercise_by_id(str(batch.exercise_id), db)
+        if exercise is None:
+            raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+        exercise_id, correct_query = exercise.id, exercise.response
+
+        # Teacher errors surface here, before the response starts streaming
+        with oracle_conn_context(BATCH, user_id) as oracle_db:
+            expected_result = get_expected_result(db, oracle_db, exercise)
+    finally:
+        db.close()
+
+    return stream_batch_verdicts(exercise_id, correct_query, expected_result, batch.user_queries, user_id)
+
+
+def stream_batch_verdicts(exercise_id, correct_query: str, expected_result: dict, user_queries: list,
+                          user_id) -> Iterator[bytes]:
+    started = time.monotonic()
+    positions = {}
+    for index, user_query in enumerate(user_queries):
+        positions.setdefault(statement_hash(user_query), []).append(index)
+
+    futures = {
+        batch_executor.submit(grade_batch_query, exercise_id, correct_query, expected_result,
+                              user_queries[indexes[0]], user_id): indexes
+        for indexes in positions.values()
+    }
+    summary = Counter()
+    try:
+        for future in as_completed(futures):
+            record = future.result()
+            summary[record["status"]] += len(futures[future])
+            for index in futures[future]:
+                yield ndjson_line({"index": index, **record})
+    finally:
+        # A client that disconnects mid-stream leaves nothing queued behind it
+        for future in futures:
+            future.cancel()
+
+    counters.increment("batch_validation.queries", len(user_queries))
+    yield ndjson_line({"summary": {
+        "total": len(user_queries),
+        "unique": len(futures),
+        "success": summary["success"],
+        "failed": summary["failed"],
+        "error": summary["error"],
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 3),
+    }})
+
+
+def grade_batch_query(exercise_id, correct_query: str, expected_result: dict, user_query: str, user_id) -> dict:
+    db = SessionLocal()
+    try:
+        with oracle_conn_context(BATCH, user_id) as oracle_db:
+            verdict, validation_result = grade_against_expected(db, oracle_db, exercise_id, correct_query,
+                                                                expected_result, user_query)
+    except AppException as e:
+        return {"status": "error", "error": e.message}
+    except Exception as e:
+        print(f"Batch validation failed: {e}")
+        return {"status": "error", "error": ErrorCodes.SERVER_ERROR}
+    finally:
+        db.close()
+
+    validation = format_validation(validation_result)["validation"]
+    return {"status": "success" if validation.get("status") == "success" else "failed", "validation": validation}
+
+
+def ndjson_line(record: dict) -> bytes:
+    return dump_json(record) + b"\n"
@@ -0,0 +1,170 @@
+from collections import Counter
+
+import oracledb
+from decouple import config
+
+from src.services.dml_sandbox import prepare_dml, prepare_dml_async
+from src.utils.sql_lexer import supports_returning, strip_statement_end
+
+TABLE = "table"
+DELTA = "delta"
+DML_PREVIEW_MODE = config("DML_PREVIEW_MODE", default=TABLE)
+
+DELTA_KEYS = ("inserted", "deleted", "updated_before", "updated_after")
+DELTA_SAVEPOINT = "dml_preview"
+ROWID_BATCH_SIZE = 500
+
+
+def delta_preview_enabled() -> bool:
+    return DML_PREVIEW_MODE == DELTA
+
+
+def rowid_batches(table: str, rowids: list):
+    for start in range(0, len(rowids), ROWID_BATCH_SIZE):
+        batch = rowids[start:start + ROWID_BATCH_SIZE]
+        binds = ", ".join(f"CHARTOROWID(:{index + 1})" for index in range(len(batch)))
+        yield f"SELECT ROWIDTOCHAR(t.ROWID), t.* FROM {table} t WHERE t.ROWID IN ({binds})", batch
+
+
+def rows_by_rowid(rows: list) -> dict:
+    return {row[0]: row[1:] for row in rows}
+
+
+def returning_statement(query: str) -> str | None:
+    # Appended after a trailing comment or semicolon the clause would be lost, those statements take a snapshot
+    statement = strip_statement_end(query)
+    if statement is None or not supports_returning(statement):
+        return None
+    return f"{statement} RETURNING ROWIDTOCHAR(ROWID) INTO :delta_rowids"
+
+
+def touched_rowids(rowids) -> list:
+    return list(dict.fromkeys(rowids.getvalue() or []))
+
+
+def changed_rows(before: dict, after: dict) -> tuple[dict, dict]:
+    changed = {rowid for rowid in before.keys() | after.keys() if before.get(rowid) != after.get(rowid)}
+    return {rowid: before[rowid] for rowid in changed if rowid in before}, \
+        {rowid: after[rowid] for rowid in changed if rowid in after}
+
+
+def table_columns(cursor, table: str) -> list:
+    cursor.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+    return [col[0] for col in cursor.description]
+
+
+def fetch_rows_by_rowid(cursor, table: str, rowids: list) -> dict:
+    rows = {}
+    for statement, batch in rowid_batches(table, rowids):
+        cursor.execute(statement, batch)
+        rows.update(rows_by_rowid(cursor.fetchall()))
+    return rows
+
+
+def fetch_table_by_rowid(cursor, table: str) -> dict:
+    cursor.execute(f"SELECT ROWIDTOCHAR(t.ROWID), t.* FROM {table} t")
+    return rows_by_rowid(cursor.fetchall())
+
+
+def returning_delta(cursor, statement: str, table: str):
+    # The statement is undone once its rows are known, callers roll back afterwards anyway
+    cursor.execute(f"SAVEPOINT {DELTA_SAVEPOINT}")
+    rowids = cursor.var(oracledb.DB_TYPE_VARCHAR)
+    cursor.execute(statement, delta_rowids=rowids)
+    touched = touched_rowids(rowids)
+
+    after = fetch_rows_by_rowid(cursor, table, touched)
+    cursor.execute(f"ROLLBACK TO SAVEPOINT {DELTA_SAVEPOINT}")
+    before = fetch_rows_by_rowid(cursor, table, touched)
+    return before, after
+
+
+def snapshot_delta(cursor, query: str, table: str):
+    before = fetch_table_by_rowid(cursor, table)
+    cursor.execute(query)
+    return changed_rows(before, fetch_table_by_rowid(cursor, table))
+
+
+def capture_dml_delta(cursor, query: str, target_table: str) -> dict:
+    query, table = prepare_dml(cursor, query, target_table)
+    columns = table_columns(cursor, table)
+    statement = returning_statement(query)
+    if statement is not None:
+        before, after = returning_delta(cursor, statement, table)
+    else:
+        before, after = snapshot_delta(cursor, query, table)
+    return build_delta(columns, before, after)
+
+
+async def table_columns_async(cursor, table: str) -> list:
+    await cursor.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+    return [col[0] for col in cursor.description]
+
+
+async def fetch_rows_by_rowid_async(cursor, table: str, rowids: list) -> dict:
+    rows = {}
+    for statement, batch in rowid_batches(table, rowids):
+        await cursor.execute(statement, batch)
+        rows.update(rows_by_rowid(await cursor.fetchall()))
+    return rows
+
+
+async def fetch_table_by_rowid_async(cursor, table: str) -> dict:
+    await cursor.execute(f"SELECT ROWIDTOCHAR(t.ROWID), t.* FROM {table} t")
+    return rows_by_rowid(await cursor.fetchall())
+
+
+async def returning_delta_async(cursor, statement: str, table: str):
+    await cursor.execute(f"SAVEPOINT {DELTA_SAVEPOINT}")
+    rowids = cursor.var(oracledb.DB_TYPE_VARCHAR)
+    await cursor.execute(statement, delta_rowids=rowids)
+    touched = touched_rowids(rowids)
+
+    after = await fetch_rows_by_rowid_async(cursor, table, touched)
+    await cursor.execute(f"ROLLBACK TO SAVEPOINT {DELTA_SAVEPOINT}")
+    before = await fetch_rows_by_rowid_async(cursor, table, touched)
+    return before, after
+
+
+async def snapshot_delta_async(cursor, query: str, table: str):
+    before = await fetch_table_by_rowid_async(cursor, table)
+    await cursor.execute(query)
+    return changed_rows(before, await fetch_table_by_rowid_async(cursor, table))
+
+
+async def capture_dml_delta_async(cursor, query: str, target_table: str) -> dict:
+    query, table = await prepare_dml_async(cursor, query, target_table)
+    columns = await table_columns_async(cursor, table)
+    statement = returning_statement(query)
+    if statement is not None:
+        before, after = await returning_delta_async(cursor, statement, table)
+    else:
+        before, after = await snapshot_delta_async(cursor, query, table)
+    return build_delta(columns, before, after)
+
+
+def build_delta(columns: list, before: dict, after: dict) -> dict:
+    updated = [rowid for rowid in before if rowid in after]
+    return {
+        "columns": columns,
+        "inserted": [row for rowid, row in after.items() if rowid not in before],
+        "deleted": [row for rowid, row in before.items() if rowid not in after],
+        "updated_before": [before[rowid] for rowid in updated],
+        "updated_after": [after[rowid] for rowid in updated],
+    }
+
+
+def net_delta_rows(delta: dict) -> list:
+    """Rows added to and removed from the table, matching rows cancel out.
+
+    Two statements leave the table in the same state exactly when their net deltas are equal.
+    """
+    balance = Counter(delta["inserted"]) + Counter(delta["updated_after"])
+    balance.subtract(delta["deleted"])
+    balance.subtract(delta["updated_before"])
+
+    rows = []
+    for row, count in balance.items():
+        sign = "+" if count > 0 else "-"
+        rows.extend([(sign, *row)] * abs(count))
+    return rows
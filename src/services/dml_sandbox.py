@@ -0,0 +1,298 @@
+import re
+
+import oracledb
+from decouple import config
+
+from src.exceptions.exceptions import AppException
+from src.oracle_db import oracle_conn_context, AUTHORING
+from src.utils.contants import ErrorCodes
+from src.utils.sql_lexer import replace_table_references
+
+DML_SANDBOX = config("ORACLE_DML_SANDBOX", default=False, cast=bool)
+SANDBOX_PREFIX = config("ORACLE_DML_SANDBOX_PREFIX", default="SBX_")
+
+NAME_ALREADY_USED = 955
+# Copied triggers and the foreign key checks stay quiet while a sandbox is filled from its table
+SANDBOX_COPYING = "SBX_COPY"
+PARENT_KEY_NOT_FOUND = -20291
+CHILD_RECORD_FOUND = -20292
+
+CURRENT_SCHEMA = "SYS_CONTEXT('USERENV', 'CURRENT_SCHEMA')"
+SANDBOXES_QUERY = f"SELECT table_name FROM all_tables WHERE owner = {CURRENT_SCHEMA} AND temporary = 'Y'"
+BASE_TABLES_QUERY = f"SELECT table_name FROM all_tables WHERE owner = {CURRENT_SCHEMA} AND temporary = 'N' " \
+                    "AND nested = 'NO' AND secondary = 'N' ORDER BY table_name"
+CONSTRAINTS_QUERY = f"""
+    SELECT constraint_name, constraint_type, search_condition_vc, generated
+    FROM all_constraints
+    WHERE owner = {CURRENT_SCHEMA} AND table_name = :table_name AND status = 'ENABLED'
+      AND constraint_type IN ('P', 'U', 'C')
+    ORDER BY constraint_type DESC, constraint_name
+"""
+CONSTRAINT_COLUMNS_QUERY = f"""
+    SELECT column_name FROM all_cons_columns
+    WHERE owner = {CURRENT_SCHEMA} AND constraint_name = :constraint_name
+    ORDER BY position
+"""
+FOREIGN_KEYS_QUERY = f"""
+    SELECT fk.constraint_name, fk.table_name, fk.delete_rule, pk.table_name AS parent_table,
+           pk.constraint_name AS parent_constraint
+    FROM all_constraints fk
+    JOIN all_constraints pk ON pk.owner = fk.r_owner AND pk.constraint_name = fk.r_constraint_name
+    WHERE fk.owner = {CURRENT_SCHEMA} AND fk.constraint_type = 'R' AND fk.status = 'ENABLED'
+      AND fk.validated = 'VALIDATED' AND (fk.table_name = :table_name OR pk.table_name = :table_name)
+    ORDER BY fk.constraint_name
+"""
+TRIGGERS_QUERY = f"""
+    SELECT trigger_name, trigger_type, action_type, description, when_clause, trigger_body
+    FROM all_triggers
+    WHERE table_owner = {CURRENT_SCHEMA} AND table_name = :table_name AND base_object_type = 'TABLE'
+      AND status = 'ENABLED'
+    ORDER BY trigger_name
+"""
+
+_ready_sandboxes = set()
+
+
+def sandbox_table_name(table: str) -> str:
+    return (SANDBOX_PREFIX + re.sub(r"\W", "_", table)).upper()[:128]
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def create_sandbox_sql(sandbox: str, table: str) -> str:
+    # Global temporary tables keep their rows per session, so students never share row locks
+    return f"CREATE GLOBAL TEMPORARY TABLE {quote_identifier(sandbox)} ON COMMIT DELETE ROWS " \
+           f"AS SELECT * FROM {quote_identifier(table)} WHERE 1 = 0"
+
+
+def fill_sandbox_sql(sandbox: str, table: str) -> str:
+    return f"""
+        BEGIN
+            DBMS_APPLICATION_INFO.SET_CLIENT_INFO('{SANDBOX_COPYING}');
+            INSERT INTO {sandbox} SELECT * FROM {table};
+            DBMS_APPLICATION_INFO.SET_CLIENT_INFO(NULL);
+        EXCEPTION
+            WHEN OTHERS THEN
+                DBMS_APPLICATION_INFO.SET_CLIENT_INFO(NULL);
+                RAISE;
+        END;
+    """
+
+
+def copying_guard() -> str:
+    return f"IF SYS_CONTEXT('USERENV', 'CLIENT_INFO') = '{SANDBOX_COPYING}' THEN RETURN; END IF;"
+
+
+def constraint_sql(cursor, sandbox: str, name: str, kind: str, condition: str | None, generated: str) -> str | None:
+    if kind == "C":
+        # NOT NULL columns already came over with the table
+        if generated == "GENERATED NAME" and re.fullmatch(r'"[^"]+" IS NOT NULL', condition or ""):
+            return None
+        body = f"CHECK ({condition})"
+    else:
+        cursor.execute(CONSTRAINT_COLUMNS_QUERY, constraint_name=name)
+        columns = ", ".join(quote_identifier(column) for column, in cursor.fetchall())
+        body = f"{'PRIMARY KEY' if kind == 'P' else 'UNIQUE'} ({columns})"
+    return f"ALTER TABLE {quote_identifier(sandbox)} ADD CONSTRAINT {quote_identifier(sandbox_table_name(name))} " \
+           f"{body}"
+
+
+def key_match(cursor, child_constraint: str, parent_constraint: str) -> tuple[list, str]:
+    cursor.execute(CONSTRAINT_COLUMNS_QUERY, constraint_name=child_constraint)
+    child_columns = [column for column, in cursor.fetchall()]
+    cursor.execute(CONSTRAINT_COLUMNS_QUERY, constraint_name=parent_constraint)
+    parent_columns = [column for column, in cursor.fetchall()]
+    condition = " AND ".join(f"p.{quote_identifier(parent)} = c.{quote_identifier(child)}"
+                             for parent, child in zip(parent_columns, child_columns))
+    return child_columns, condition
+
+
+def foreign_key_check(child: str, parent: str, child_columns: list, condition: str, error: int, message: str) -> str:
+    not_null = " AND ".join(f"c.{quote_identifier(column)} IS NOT NULL" for column in child_columns)
+    return f"""
+        SELECT COUNT(*) INTO violations FROM {child} c
+        WHERE {not_null} AND NOT EXISTS (SELECT 1 FROM {parent} p WHERE {condition}) AND ROWNUM = 1;
+        IF violations > 0 THEN
+            RAISE_APPLICATION_ERROR({error}, {quote_literal(message)});
+        END IF;
+    """
+
+
+def foreign_key_trigger_sql(sandbox: str, suffix: str, events: str, checks: list) -> str:
+    # Oracle refuses foreign keys on temporary tables, statement triggers enforce them instead
+    name = quote_identifier(f"{sandbox}_{suffix}"[:128])
+    return f"""
+        CREATE OR REPLACE TRIGGER {name} AFTER {events} ON {quote_identifier(sandbox)}
+        DECLARE
+            violations NUMBER;
+        BEGIN
+            {copying_guard()}
+            {"".join(checks)}
+        END;
+    """
+
+
+def foreign_key_triggers(cursor, schema: str, table: str, sandbox: str) -> list:
+    cursor.execute(FOREIGN_KEYS_QUERY, table_name=table)
+    child_checks, parent_checks = [], []
+    self_referencing = False
+    for name, child_table, delete_rule, parent_table, parent_constraint in cursor.fetchall():
+        child_columns, condition = key_match(cursor, name, parent_constraint)
+        message = f"integrity constraint ({schema}.{name}) violated"
+        if child_table == table:
+            self_referencing = self_referencing or parent_table == table
+            parent = quote_identifier(sandbox if parent_table == table else parent_table)
+            child_checks.append(foreign_key_check(quote_identifier(sandbox), parent, child_columns, condition,
+                                                  PARENT_KEY_NOT_FOUND, f"{message} - parent key not found"))
+        elif delete_rule == "NO ACTION":
+            # Cascading keys would change the child table, which the statement never sees in the sandbox anyway
+            parent_checks.append(foreign_key_check(quote_identifier(child_table), quote_identifier(sandbox),
+                                                   child_columns, condition, CHILD_RECORD_FOUND,
+                                                   f"{message} - child record found"))
+
+    triggers = []
+    if child_checks:
+        events = "INSERT OR UPDATE OR DELETE" if self_referencing else "INSERT OR UPDATE"
+        triggers.append(foreign_key_trigger_sql(sandbox, "FKC", events, child_checks))
+    if parent_checks:
+        triggers.append(foreign_key_trigger_sql(sandbox, "FKP", "UPDATE OR DELETE", parent_checks))
+    return triggers
+
+
+def copied_trigger_sql(table: str, sandbox: str, name: str, trigger_type: str, action_type: str, description: str,
+                       when_clause: str | None, body: str) -> str | None:
+    if action_type != "PL/SQL" or trigger_type == "COMPOUND":
+        return None
+    header = re.sub(rf'^\s*(?:"?[\w$#]+"?\.)?"?{re.escape(name)}"?', quote_identifier(sandbox_table_name(name)),
+                    description, count=1, flags=re.IGNORECASE)
+    header = re.sub(rf'\bON\s+(?:"?[\w$#]+"?\.)?"?{re.escape(table)}"?(?=\s|$)', f"ON {quote_identifier(sandbox)}",
+                    header, count=1, flags=re.IGNORECASE)
+    when = f"WHEN ({when_clause})" if when_clause else ""
+    # The original body runs as a nested block, so its own declarations still work
+    return f"CREATE OR REPLACE TRIGGER {header} {when}\nBEGIN\n{copying_guard()}\n{body}\nEND;"
+
+
+def provision_sandbox(cursor, schema: str, table: str) -> str | None:
+    """Creates a table's sandbox with its keys, checks and triggers, or returns None if it already exists."""
+    sandbox = sandbox_table_name(table)
+    try:
+        cursor.execute(create_sandbox_sql(sandbox, table))
+    except oracledb.DatabaseError as e:
+        error, = e.args
+        if error.code != NAME_ALREADY_USED:
+            raise
+        return None
+
+    cursor.execute(CONSTRAINTS_QUERY, table_name=table)
+    statements = []
+    for name, kind, condition, generated in cursor.fetchall():
+        statement = constraint_sql(cursor, sandbox, name, kind, condition, generated)
+        if statement:
+            statements.append(statement)
+    statements.extend(foreign_key_triggers(cursor, schema, table, sandbox))
+
+    cursor.execute(TRIGGERS_QUERY, table_name=table)
+    for name, trigger_type, action_type, description, when_clause, body in cursor.fetchall():
+        statement = copied_trigger_sql(table, sandbox, name, trigger_type, action_type, description, when_clause,
+                                       body)
+        if statement is None:
+            print(f"WARNING: Trigger {name} on {table} can't be copied to its sandbox")
+            continue
+        statements.append(statement)
+
+    for statement in statements:
+        cursor.execute(statement)
+    return sandbox
+
+
+def provision_sandboxes():
+    """Builds the missing sandboxes at startup, DDL commits implicitly and has no place in a request."""
+    try:
+        with oracle_conn_context(AUTHORING) as oracle_conn, oracle_conn.cursor() as cursor:
+            cursor.execute(f"SELECT {CURRENT_SCHEMA} FROM dual")
+            schema, = cursor.fetchone()
+            cursor.execute(BASE_TABLES_QUERY)
+            tables = [table for table, in cursor.fetchall() if not table.startswith(SANDBOX_PREFIX.upper())]
+            for table in tables:
+                try:
+                    if provision_sandbox(cursor, schema, table):
+                        print(f"Sandbox for '{table}' created")
+                except oracledb.DatabaseError as e:
+                    print(f"FATAL: Couldn't create the sandbox for '{table}': {e}")
+            cursor.execute(SANDBOXES_QUERY)
+            _ready_sandboxes.update(sandbox for sandbox, in cursor.fetchall())
+    except Exception as e:
+        print(f"FATAL: Couldn't provision DML sandboxes: {e}")
+
+
+def sandbox_target(target_table: str | None) -> str:
+    # Without a single target there is no sandbox to redirect to, the statement would touch the shared table
+    if not target_table:
+        raise AppException(ErrorCodes.ERR_DML_NO_TABLE, 400)
+    return sandbox_table_name(target_table)
+
+
+def ensure_sandbox(cursor, table: str) -> str:
+    sandbox = sandbox_target(table)
+    if sandbox not in _ready_sandboxes:
+        cursor.execute(SANDBOXES_QUERY)
+        _ready_sandboxes.update(name for name, in cursor.fetchall())
+        if sandbox not in _ready_sandboxes:
+            raise AppException(ErrorCodes.DML_SANDBOX_MISSING, 503)
+    return sandbox
+
+
+def open_sandbox(cursor, table: str) -> str:
+    sandbox = ensure_sandbox(cursor, table)
+    cursor.execute(fill_sandbox_sql(sandbox, table))
+    return sandbox
+
+
+def prepare_dml(cursor, query: str, target_table: str | None) -> tuple[str, str | None]:
+    if not DML_SANDBOX:
+        return query, target_table
+
+    sandbox = open_sandbox(cursor, target_table)
+    return replace_table_references(query, target_table, sandbox), sandbox
+
+
+def execute_dml(cursor, query: str, target_table: str | None) -> str | None:
+    query, result_table = prepare_dml(cursor, query, target_table)
+    cursor.execute(query)
+    return result_table
+
+
+async def ensure_sandbox_async(cursor, table: str) -> str:
+    sandbox = sandbox_target(table)
+    if sandbox not in _ready_sandboxes:
+        await cursor.execute(SANDBOXES_QUERY)
+        _ready_sandboxes.update(name for name, in await cursor.fetchall())
+        if sandbox not in _ready_sandboxes:
+            raise AppException(ErrorCodes.DML_SANDBOX_MISSING, 503)
+    return sandbox
+
+
+async def open_sandbox_async(cursor, table: str) -> str:
+    sandbox = await ensure_sandbox_async(cursor, table)
+    await cursor.execute(fill_sandbox_sql(sandbox, table))
+    return sandbox
+
+
+async def prepare_dml_async(cursor, query: str, target_table: str | None) -> tuple[str, str | None]:
+    if not DML_SANDBOX:
+        return query, target_table
+
+    sandbox = await open_sandbox_async(cursor, target_table)
+    return replace_table_references(query, target_table, sandbox), sandbox
+
+
+async def execute_dml_async(cursor, query: str, target_table: str | None) -> str | None:
+    query, result_table = await prepare_dml_async(cursor, query, target_table)
+    await cursor.execute(query)
+    return result_table
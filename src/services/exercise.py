@@ -3,20 +3,30 @@ from uuid import UUID
 
 import oracledb
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from src.exceptions.exceptions import AppException
+from src.models.exercise import Exercise
+from src.oracle_db import DATASET_VERSION
 from src.repositories.exercise import add_exercise_to_db, get_exercises_db, find_exercise_by_id, \
-    delete_exercise_by_id_from_db, update_exercise_db, get_exercises_total_db
+    delete_exercise_by_id_from_db, update_exercise_db, get_exercises_total_db, get_all_exercises_db
+from src.repositories.exercise_expected_result import find_expected_result_by_exercise_id, save_expected_result_db, \
+    expected_result_to_dict
+from src.repositories.exercise_verdict import detach_verdicts_db
 from src.repositories.laboratory import find_laboratory_by_id
 from src.schemas.exercise import CreateExerciseSchema, UpdateExerciseSchema
-from src.schemas.query import QuerySchema
-from src.services.query_runner import run_select_query
+from src.services.dml_preview import delta_preview_enabled
+from src.services.query_runner import compute_expected_result
+from src.services.query_runner_async import compute_expected_result_async
 from src.utils.contants import ErrorCodes
+from src.utils.single_flight import single_flight
+from src.utils.sql_lexer import statement_hash
 
 
 def add_exercise(db: Session, user_id: UUID, exercise: CreateExerciseSchema, oracle_conn: oracledb.Connection):
-    response = run_select_query(oracle_conn, QuerySchema(query=exercise.response))
+    expected_result = compute_expected_result(oracle_conn, exercise.response)
     saved_exercise = add_exercise_to_db(exercise, user_id, db)
+    save_expected_result_db(db, saved_exercise.id, expected_result, DATASET_VERSION)
     return saved_exercise
 
 
@@ -32,15 +42,16 @@ def update_exercise(updated_exercise: UpdateExerciseSchema, oracle_conn: oracled
     exercise = find_exercise_by_id(exercise_id, db)
     if not exercise:
         raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
-    response = run_select_query(oracle_conn, QuerySchema(query=updated_exercise.response))
+    expected_result = compute_expected_result(oracle_conn, updated_exercise.response)
+    solution_changed = statement_hash(exercise.response or "") != statement_hash(updated_exercise.response or "")
     exercise.request = updated_exercise.request
     exercise.response = updated_exercise.response
     exercise.order_index = updated_exercise.order_index
     exercise.laboratory_id = updated_exercise.laboratory_id
     exercise.updated_at = datetime.datetime.now(datetime.UTC)
     updated_exercise = update_exercise_db(exercise, db)
-
-    return updated_exercise
+    save_expected_result_db(db, updated_exercise.id, expected_result, DATASET_VERSION)
+    return updated_exercise, solution_changed
 
 
 def delete_exercise_by_id(exercise_id: str, db: Session):
@@ -48,8 +59,56 @@ def delete_exercise_by_id(exercise_id: str, db: Session):
     if not exercise:
         raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
 
+    detach_verdicts_db(db, [exercise.id])
     return delete_exercise_by_id_from_db(exercise, db)
 
 
 def get_exercises_total(db: Session):
     return get_exercises_total_db(db)
+
+
+def get_expected_result(db: Session, oracle_conn: oracledb.Connection, exercise: Exercise):
+    stored_result = find_expected_result_by_exercise_id(exercise.id, db)
+    if is_expected_result_stale(stored_result):
+        return single_flight.do(("expected_result", str(exercise.id), DATASET_VERSION),
+                                refresh_expected_result, db, oracle_conn, exercise)
+    return expected_result_to_dict(stored_result)
+
+
+async def get_expected_result_async(db: Session, oracle_conn: oracledb.AsyncConnection, exercise: Exercise):
+    stored_result = await run_in_threadpool(find_expected_result_by_exercise_id, exercise.id, db)
+    if is_expected_result_stale(stored_result):
+        return await single_flight.do_async(("expected_result", str(exercise.id), DATASET_VERSION),
+                                            refresh_expected_result_async, db, oracle_conn, exercise)
+    return expected_result_to_dict(stored_result)
+
+
+def is_expected_result_stale(stored_result) -> bool:
+    return stored_result is None or stored_result.dataset_version != DATASET_VERSION \
+        or (stored_result.is_dml and bool(stored_result.is_delta) != delta_preview_enabled())
+
+
+def refresh_expected_result(db: Session, oracle_conn: oracledb.Connection, exercise: Exercise):
+    expected_result = compute_expected_result(oracle_conn, exercise.response)
+    stored_result = save_expected_result_db(db, exercise.id, expected_result, DATASET_VERSION)
+    return expected_result_to_dict(stored_result)
+
+
+async def refresh_expected_result_async(db: Session, oracle_conn: oracledb.AsyncConnection, exercise: Exercise):
+    expected_result = await compute_expected_result_async(oracle_conn, exercise.response)
+    stored_result = await run_in_threadpool(save_expected_result_db, db, exercise.id, expected_result,
+                                            DATASET_VERSION)
+    return expected_result_to_dict(stored_result)
+
+
+def refresh_all_expected_results(db: Session, oracle_conn: oracledb.Connection):
+    refreshed = 0
+    failed = []
+    for exercise in get_all_exercises_db(db):
+        try:
+            refresh_expected_result(db, oracle_conn, exercise)
+            refreshed += 1
+        except AppException as e:
+            failed.append({"exercise_id": exercise.id, "error": e.message})
+
+    return {"refreshed": refreshed, "failed": failed, "dataset_version": DATASET_VERSION}
@@ -2,17 +2,26 @@ from uuid import UUID
 
 import oracledb
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from src.exceptions.exceptions import AppException
+from src.models.exercise import Exercise
 from src.repositories.exercise import find_exercise_by_id
 from src.repositories.exercise_history import get_exercise_history_db, add_exercise_history_to_db, \
-    get_exercises_scoreboard_db, get_laboratories_scoreboard_db, make_dict_json_serializable, \
-    get_exercise_history_by_user_db, get_exercises_stats_db, get_only_failed_exercises_stats_db
+    get_exercises_scoreboard_db, get_laboratories_scoreboard_db, get_exercise_history_by_user_db, \
+    get_exercises_stats_db, get_only_failed_exercises_stats_db
+from src.repositories.exercise_verdict import find_verdict, save_verdict_db, record_verdict_hit
 from src.repositories.user import find_user_by_id
 from src.schemas.exercise_history import CreateExerciseHistorySchema
 from src.schemas.query import ValidateQuerySchema
+from src.services.exercise import get_expected_result, get_expected_result_async
 from src.services.query_runner import compare_queries
+from src.services.query_runner_async import compare_queries_async
 from src.utils.contants import ErrorCodes
+from src.utils.metrics import counters
+from src.utils.result_format import format_validation
+from src.utils.single_flight import single_flight
+from src.utils.sql_lexer import is_deterministic, statement_hash
 
 
 def get_exercise_history(db: Session, user_id: UUID, exercise_id: str):
@@ -31,27 +40,117 @@ def get_exercise_history_by_user(db: Session, user_id: str):
 
 def add_exercise_history(db: Session, oracle_db: oracledb.Connection, user_id: UUID,
                          request: CreateExerciseHistorySchema):
-    if find_exercise_by_id(str(request.exercise_id), db) is None:
+    exercise = find_exercise_by_id(str(request.exercise_id), db)
+    if exercise is None:
         raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
 
-    validation_result = compare_queries(oracle_db, ValidateQuerySchema(user_query=request.response,
-                                                                       correct_query=request.correct_response))
-    validation_result = make_dict_json_serializable(validation_result)
-    saved_history = add_exercise_history_to_db(db, user_id, validation_result, request)
+    verdict, validation_result = grade_submission(db, oracle_db, exercise, request.response)
+    validation_result = format_validation(validation_result)
+    saved_history = add_exercise_history_to_db(db, user_id, validation_result, request, verdict)
     return saved_history, validation_result
 
 
+async def add_exercise_history_async(db: Session, oracle_db: oracledb.AsyncConnection, user_id: UUID,
+                                     request: CreateExerciseHistorySchema):
+    exercise = await run_in_threadpool(find_exercise_by_id, str(request.exercise_id), db)
+    if exercise is None:
+        raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+
+    verdict, validation_result = await grade_submission_async(db, oracle_db, exercise, request.response)
+    validation_result = format_validation(validation_result)
+    saved_history = await run_in_threadpool(add_exercise_history_to_db, db, user_id, validation_result, request,
+                                            verdict)
+    return saved_history, validation_result
+
+
+def grade_submission(db: Session, oracle_db: oracledb.Connection, exercise: Exercise, user_query: str):
+    expected_result = get_expected_result(db, oracle_db, exercise)
+    return grade_against_expected(db, oracle_db, exercise.id, exercise.response, expected_result, user_query)
+
+
+def grade_against_expected(db: Session, oracle_db: oracledb.Connection, exercise_id, correct_query: str,
+                           expected_result: dict, user_query: str):
+    sql_hash = statement_hash(user_query)
+
+    verdict = find_verdict(db, exercise_id, expected_result["version"], sql_hash)
+    if verdict is not None:
+        counters.increment("verdicts.hit")
+        record_verdict_hit(db, verdict)
+        return verdict, {"validation": verdict.validation}
+
+    counters.increment("verdicts.miss")
+    validation_result = compare_queries(oracle_db, ValidateQuerySchema(user_query=user_query,
+                                                                       correct_query=correct_query),
+                                        expected_result)
+    if not is_memoizable(user_query, validation_result["validation"]):
+        return None, validation_result
+
+    verdict = save_verdict_db(db, exercise_id, expected_result["version"], sql_hash, validation_result["validation"])
+    return verdict, validation_result
+
+
+async def grade_submission_async(db: Session, oracle_db: oracledb.AsyncConnection, exercise: Exercise,
+                                 user_query: str):
+    expected_result = await get_expected_result_async(db, oracle_db, exercise)
+    sql_hash = statement_hash(user_query)
+
+    verdict = await run_in_threadpool(find_verdict, db, exercise.id, expected_result["version"], sql_hash)
+    if verdict is not None:
+        counters.increment("verdicts.hit")
+        await run_in_threadpool(record_verdict_hit, db, verdict)
+        return verdict, {"validation": verdict.validation}
+
+    counters.increment("verdicts.miss")
+    validation_result = await compare_queries_async(oracle_db, ValidateQuerySchema(user_query=user_query,
+                                                                                   correct_query=exercise.response),
+                                                    expected_result)
+    if not is_memoizable(user_query, validation_result["validation"]):
+        return None, validation_result
+
+    verdict = await run_in_threadpool(save_verdict_db, db, exercise.id, expected_result["version"], sql_hash,
+                                      validation_result["validation"])
+    return verdict, validation_result
+
+
+def is_memoizable(user_query: str, validation: dict):
+    return is_deterministic(user_query) and ErrorCodes.SERVER_ERROR not in validation.get("message", "")
+
+
+def validate_query(db: Session, oracle_db: oracledb.Connection, query: ValidateQuerySchema):
+    if query.exercise_id is None:
+        return compare_queries(oracle_db, query)
+
+    exercise = find_exercise_by_id(str(query.exercise_id), db)
+    if exercise is None:
+        raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+
+    verdict, validation_result = grade_submission(db, oracle_db, exercise, query.user_query)
+    return validation_result
+
+
+async def validate_query_async(db: Session, oracle_db: oracledb.AsyncConnection, query: ValidateQuerySchema):
+    if query.exercise_id is None:
+        return await compare_queries_async(oracle_db, query)
+
+    exercise = await run_in_threadpool(find_exercise_by_id, str(query.exercise_id), db)
+    if exercise is None:
+        raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+
+    verdict, validation_result = await grade_submission_async(db, oracle_db, exercise, query.user_query)
+    return validation_result
+
+
 def get_exercises_scoreboard(db: Session):
-    return get_exercises_scoreboard_db(db)
+    return single_flight.do(("exercises_scoreboard",), get_exercises_scoreboard_db, db)
 
 
 def get_laboratories_scoreboard(db: Session):
-    return get_laboratories_scoreboard_db(db)
+    return single_flight.do(("laboratories_scoreboard",), get_laboratories_scoreboard_db, db)
 
 
 def get_exercises_stats(db: Session):
-    return get_exercises_stats_db(db)
+    return single_flight.do(("exercises_stats",), get_exercises_stats_db, db)
 
 
 def get_only_failed_exercises_stats(db: Session):
-    return get_only_failed_exercises_stats_db(db)
+    return single_flight.do(("failed_exercises_stats",), get_only_failed_exercises_stats_db, db)
@@ -0,0 +1,257 @@
+import asyncio
+import threading
+import time
+from uuid import UUID
+
+from decouple import config
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.database import SessionLocal
+from src.exceptions.exceptions import AppException
+from src.models.exercise_history import DONE, FAILED
+from src.oracle_db import oracle_conn_context, GRADING, ORACLE_RETRY_AFTER
+from src.repositories.exercise import find_exercise_by_id
+from src.repositories.exercise_history import add_pending_exercise_history_db, find_exercise_history_by_id, \
+    claim_exercise_history_db, release_exercise_history_db, complete_leased_history_db, fail_leased_history_db, \
+    fail_exercise_history_db, get_pending_exercise_history_ids_db, reset_stale_exercise_history_db
+from src.schemas.exercise_history import CreateExerciseHistorySchema, ExerciseHistorySchemaOut
+from src.services.exercise_history import grade_submission
+from src.utils.contants import ErrorCodes
+from src.utils.job_queue import MemoryJobQueue, RedisJobQueue
+from src.utils.metrics import counters
+from src.utils.result_format import format_validation
+from src.utils.responses import dump_json
+
+GRADING_QUEUE = config("GRADING_QUEUE", default=False, cast=bool)
+GRADING_QUEUE_BACKEND = config("GRADING_QUEUE_BACKEND", default="memory")
+GRADING_QUEUE_REDIS_URL = config("GRADING_QUEUE_REDIS_URL", default="redis://localhost:6379/0")
+GRADING_QUEUE_KEY = config("GRADING_QUEUE_KEY", default="sql_learner:grading_jobs")
+GRADING_QUEUE_MAX_DEPTH = config("GRADING_QUEUE_MAX_DEPTH", default=1000, cast=int)
+GRADING_QUEUE_WORKERS = config("GRADING_QUEUE_WORKERS", default=3, cast=int)
+GRADING_QUEUE_RETRY_DELAY = config("GRADING_QUEUE_RETRY_DELAY", default=1.0, cast=float)
+GRADING_EVENTS_POLL_INTERVAL = config("GRADING_EVENTS_POLL_INTERVAL", default=0.5, cast=float)
+GRADING_EVENTS_TIMEOUT = config("GRADING_EVENTS_TIMEOUT", default=120.0, cast=float)
+# Has to outlast grading one submission, its admission wait plus its grading call timeouts
+GRADING_JOB_LEASE_SECONDS = config("GRADING_JOB_LEASE_SECONDS", default=120, cast=int)
+GRADING_REAP_INTERVAL = config("GRADING_REAP_INTERVAL", default=GRADING_JOB_LEASE_SECONDS / 4, cast=float)
+
+FINISHED = (DONE, FAILED)
+POP_TIMEOUT = 1.0
+
+grading_workers = []
+grading_reapers = []
+grading_workers_stop = threading.Event()
+
+
+def create_job_queue():
+    if GRADING_QUEUE_BACKEND == "redis":
+        import redis
+        return RedisJobQueue(redis.Redis.from_url(GRADING_QUEUE_REDIS_URL, decode_responses=True),
+                             GRADING_QUEUE_KEY, GRADING_QUEUE_MAX_DEPTH)
+    return MemoryJobQueue(GRADING_QUEUE_MAX_DEPTH)
+
+
+grading_queue = create_job_queue()
+
+
+def queue_full_exception() -> AppException:
+    return AppException(ErrorCodes.GRADING_QUEUE_FULL, 429, headers={"Retry-After": str(ORACLE_RETRY_AFTER)})
+
+
+def enqueue_submission(db: Session, user_id: UUID, request: CreateExerciseHistorySchema) -> dict:
+    if find_exercise_by_id(str(request.exercise_id), db) is None:
+        raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+    if grading_queue.depth() >= grading_queue.max_depth:
+        counters.increment("grading_jobs.rejected")
+        raise queue_full_exception()
+
+    history = add_pending_exercise_history_db(db, user_id, request)
+    if not grading_queue.push(str(history.id)):
+        counters.increment("grading_jobs.rejected")
+        fail_exercise_history_db(db, history, ErrorCodes.GRADING_QUEUE_FULL)
+        raise queue_full_exception()
+
+    counters.increment("grading_jobs.enqueued")
+    return job_to_dict(history)
+
+
+def job_to_dict(history) -> dict:
+    return {
+        "job_id": history.id,
+        "status": history.status,
+        "history": ExerciseHistorySchemaOut.model_validate(history, from_attributes=True).model_dump(),
+    }
+
+
+def get_job(db: Session, job_id: str, user_data: dict) -> dict:
+    history = find_exercise_history_by_id(db, job_id)
+    # Other users' submissions are reported as missing rather than forbidden
+    if history is None or (str(history.user_id) != str(user_data["id"]) and user_data["role"] not in (1, 2)):
+        raise AppException(ErrorCodes.GRADING_JOB_NOT_FOUND, 404)
+    return job_to_dict(history)
+
+
+def get_job_snapshot(job_id: str, user_data: dict) -> dict:
+    db = SessionLocal()
+    try:
+        return get_job(db, job_id, user_data)
+    finally:
+        db.close()
+
+
+def sse_event(event: str, data: dict) -> str:
+    payload = dump_json(data).decode()
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def job_events(job_id: str, user_data: dict):
+    deadline = time.monotonic() + GRADING_EVENTS_TIMEOUT
+    last_status = None
+    while True:
+        job = await run_in_threadpool(get_job_snapshot, job_id, user_data)
+        if job["status"] in FINISHED:
+            yield sse_event("result", job)
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield sse_event("status", {"job_id": job["job_id"], "status": last_status})
+        elif time.monotonic() >= deadline:
+            yield sse_event("timeout", {"job_id": job["job_id"], "status": last_status})
+            return
+        else:
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(GRADING_EVENTS_POLL_INTERVAL)
+
+
+def grade_job(job_id: str):
+    db = SessionLocal()
+    lease_id = None
+    try:
+        lease_id = claim_exercise_history_db(db, job_id)
+        if lease_id is None:
+            return
+        history = find_exercise_history_by_id(db, job_id)
+        exercise = find_exercise_by_id(str(history.exercise_id), db)
+        if exercise is None:
+            fail_leased_history_db(db, job_id, lease_id, ErrorCodes.EXERCISE_NOT_FOUND)
+            return
+
+        try:
+            with oracle_conn_context(GRADING, str(history.user_id)) as oracle_db:
+                verdict, validation_result = grade_submission(db, oracle_db, exercise, history.response)
+        except AppException as e:
+            if e.message == ErrorCodes.ORACLE_POOL_BUSY:
+                requeue_job(db, job_id, lease_id)
+                return
+            counters.increment("grading_jobs.failed")
+            fail_leased_history_db(db, job_id, lease_id, e.message)
+            return
+
+        if not complete_leased_history_db(db, job_id, lease_id, format_validation(validation_result), verdict):
+            # Outlived its lease, the submission was handed to another worker meanwhile
+            counters.increment("grading_jobs.lease_lost")
+            return
+        counters.increment("grading_jobs.done")
+    except Exception as e:
+        print(f"Grading job {job_id} failed: {e}")
+        counters.increment("grading_jobs.failed")
+        db.rollback()
+        if lease_id is not None:
+            fail_leased_history_db(db, job_id, lease_id, ErrorCodes.SERVER_ERROR)
+    finally:
+        db.close()
+
+
+def requeue_job(db: Session, job_id: str, lease_id):
+    counters.increment("grading_jobs.requeued")
+    if not release_exercise_history_db(db, job_id, lease_id):
+        return
+    grading_workers_stop.wait(GRADING_QUEUE_RETRY_DELAY)
+    push_job(job_id)
+
+
+def push_job(job_id: str):
+    if not grading_queue.push(job_id):
+        print(f"Grading job {job_id} could not be requeued, it stays pending")
+
+
+def grading_worker():
+    while not grading_workers_stop.is_set():
+        try:
+            job_id = grading_queue.pop(POP_TIMEOUT)
+        except Exception as e:
+            print(f"Grading queue unavailable: {e}")
+            grading_workers_stop.wait(GRADING_QUEUE_RETRY_DELAY)
+            continue
+        if job_id is not None:
+            grade_job(job_id)
+
+
+def recover_pending_jobs():
+    # Only the in-process queue forgets its jobs on restart, a shared backend still holds them
+    if grading_queue.backend != "memory":
+        return
+    db = SessionLocal()
+    try:
+        for job_id in get_pending_exercise_history_ids_db(db):
+            if not grading_queue.push(job_id):
+                break
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs():
+    # Running rows are only taken back once their lease ran out, live workers elsewhere keep theirs
+    db = SessionLocal()
+    try:
+        job_ids = reset_stale_exercise_history_db(db, GRADING_JOB_LEASE_SECONDS)
+    finally:
+        db.close()
+    for job_id in job_ids:
+        counters.increment("grading_jobs.recovered")
+        push_job(job_id)
+
+
+def grading_reaper():
+    while not grading_workers_stop.is_set():
+        try:
+            requeue_stale_jobs()
+        except Exception as e:
+            print(f"Couldn't requeue stale grading jobs: {e}")
+        grading_workers_stop.wait(GRADING_REAP_INTERVAL)
+
+
+def start_grading_workers():
+    grading_workers_stop.clear()
+    recover_pending_jobs()
+    for index in range(GRADING_QUEUE_WORKERS):
+        worker = threading.Thread(target=grading_worker, name=f"grading-worker-{index}", daemon=True)
+        worker.start()
+        grading_workers.append(worker)
+    reaper = threading.Thread(target=grading_reaper, name="grading-reaper", daemon=True)
+    reaper.start()
+    grading_reapers.append(reaper)
+    print(f"Started {GRADING_QUEUE_WORKERS} grading workers ({grading_queue.backend} queue)")
+
+
+def stop_grading_workers():
+    grading_workers_stop.set()
+    for worker in grading_workers + grading_reapers:
+        worker.join(timeout=POP_TIMEOUT * 2)
+    grading_workers.clear()
+    grading_reapers.clear()
+
+
+def grading_queue_stats() -> dict:
+    try:
+        depth = grading_queue.depth()
+    except Exception:
+        depth = None
+    return {
+        "enabled": GRADING_QUEUE,
+        "backend": grading_queue.backend,
+        "depth": depth,
+        "max_depth": grading_queue.max_depth,
+        "workers": sum(1 for worker in grading_workers if worker.is_alive()),
+    }
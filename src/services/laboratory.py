@@ -3,6 +3,7 @@ from uuid import UUID
 from sqlalchemy.orm import Session
 
 from src.exceptions.exceptions import AppException
+from src.repositories.exercise_verdict import detach_verdicts_db
 from src.repositories.laboratory import add_laboratory_to_db, get_laboratories_db, delete_laboratory_by_id_from_db, \
     find_laboratory_by_id, update_laboratory_db
 from src.schemas.laboratory import CreateLaboratorySchema
@@ -23,6 +24,7 @@ def delete_laboratory_by_id(laboratory_id: str, db: Session):
     laboratory = find_laboratory_by_id(laboratory_id, db)
     if not laboratory:
         raise AppException(ErrorCodes.LABORATORY_NOT_FOUND, 404)
+    detach_verdicts_db(db, [exercise.id for exercise in laboratory.exercises])
     return delete_laboratory_by_id_from_db(laboratory, db)
 
 
@@ -0,0 +1,71 @@
+import oracledb
+from decouple import config
+
+from src.exceptions.exceptions import AppException
+from src.oracle_db import oracle_conn_context, is_call_timeout, PARSE, DATASET_VERSION
+from src.schemas.query import QuerySchema
+from src.services.query_runner import check_for_ddl, check_for_tcl
+from src.utils.contants import ErrorCodes
+from src.utils.lru_cache import TTLCache, MISSING
+from src.utils.metrics import counters
+from src.utils.sql_lexer import classify_statement, normalize_statement, leading_keyword, QUERY_KEYWORDS
+
+PARSE_CACHE_SIZE = config("PARSE_CACHE_SIZE", default=4096, cast=int)
+PARSE_CACHE_TTL = config("PARSE_CACHE_TTL", default=300, cast=float)
+
+parse_cache = TTLCache(PARSE_CACHE_SIZE, PARSE_CACHE_TTL)
+
+
+def parse_query(query: QuerySchema, user_id=None) -> dict:
+    # Oracle runs DDL as soon as it is parsed, only statements known to touch rows alone reach the database
+    check_for_ddl(query.query)
+    check_for_tcl(query.query)
+    if leading_keyword(query.query) not in QUERY_KEYWORDS:
+        raise AppException(ErrorCodes.PARSE_REQUIRES_QUERY, 403)
+
+    # Errors carry positions in the submitted text, only valid statements share an entry across spellings
+    valid_key = ("valid", normalize_statement(query.query), DATASET_VERSION)
+    error_key = ("error", query.query, DATASET_VERSION)
+    for key in (valid_key, error_key):
+        result = parse_cache.get(key)
+        if result is not MISSING:
+            counters.increment("parse.cache_hit")
+            return result
+
+    counters.increment("parse.cache_miss")
+    with oracle_conn_context(PARSE, user_id) as oracle_conn:
+        result = parse_statement(oracle_conn, query.query)
+    parse_cache.set(valid_key if result["valid"] else error_key, result)
+    return result
+
+
+def parse_statement(oracle_conn: oracledb.Connection, statement: str) -> dict:
+    kind = classify_statement(statement).kind
+    with oracle_conn.cursor() as cursor:
+        try:
+            cursor.parse(statement)
+        except oracledb.DatabaseError as e:
+            error, = e.args
+            if is_call_timeout(error):
+                raise AppException(ErrorCodes.QUERY_TIMEOUT, 408)
+            return {"valid": False, "statement_type": kind, "error": parse_error(statement, error)}
+
+        columns = [{
+            "name": column.name,
+            "type": column.type_code.name.removeprefix("DB_TYPE_"),
+            "nullable": column.null_ok,
+        } for column in cursor.description or []]
+
+    return {"valid": True, "statement_type": kind, "columns": columns}
+
+
+def parse_error(statement: str, error) -> dict:
+    offset = error.offset or 0
+    preceding = statement[:offset]
+    return {
+        "code": error.full_code,
+        "message": error.message.strip(),
+        "offset": offset,
+        "line": preceding.count("\n") + 1,
+        "column": offset - (preceding.rfind("\n") + 1) + 1,
+    }
@@ -0,0 +1,135 @@
+import uuid
+
+import oracledb
+from decouple import config
+
+from src.exceptions.exceptions import AppException
+from src.oracle_db import is_call_timeout
+from src.utils.contants import ErrorCodes
+from src.utils.lru_cache import TTLCache, MISSING
+from src.utils.metrics import counters
+from src.utils.sql_lexer import normalize_statement
+
+PLAN_CHECK = config("PLAN_CHECK", default=True, cast=bool)
+PLAN_MAX_COST = config("PLAN_MAX_COST", default=100000, cast=int)
+PLAN_MAX_CARDINALITY = config("PLAN_MAX_CARDINALITY", default=10000000, cast=int)
+PLAN_OVER_LIMIT_ACTION = config("PLAN_OVER_LIMIT_ACTION", default="cap")
+PLAN_CAPPED_ROWS = config("PLAN_CAPPED_ROWS", default=100, cast=int)
+PLAN_CACHE_SIZE = config("PLAN_CACHE_SIZE", default=2048, cast=int)
+PLAN_CACHE_TTL = config("PLAN_CACHE_TTL", default=600, cast=float)
+
+CAP = "cap"
+PLAN_STEP_COLUMNS = ("id", "parent_id", "depth", "operation", "options", "object_name", "cost",
+                     "estimated_rows", "starts", "actual_rows", "buffer_gets", "disk_reads", "elapsed_us")
+
+PLAN_ROOT_QUERY = "SELECT cost, cardinality FROM plan_table WHERE statement_id = :statement_id AND id = 0"
+PLAN_CLEANUP_QUERY = "DELETE FROM plan_table WHERE statement_id = :statement_id"
+
+plan_cache = TTLCache(PLAN_CACHE_SIZE, PLAN_CACHE_TTL)
+
+
+def explain_statement(oracle_conn: oracledb.Connection, query: str) -> tuple | None:
+    statement_id = uuid.uuid4().hex
+    with oracle_conn.cursor() as cursor:
+        try:
+            cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {query}")
+            cursor.execute(PLAN_ROOT_QUERY, statement_id=statement_id)
+            row = cursor.fetchone()
+            cursor.execute(PLAN_CLEANUP_QUERY, statement_id=statement_id)
+        except oracledb.DatabaseError as e:
+            return explain_failed(e)
+    return row
+
+
+async def explain_statement_async(oracle_conn: oracledb.AsyncConnection, query: str) -> tuple | None:
+    statement_id = uuid.uuid4().hex
+    with oracle_conn.cursor() as cursor:
+        try:
+            await cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {query}")
+            await cursor.execute(PLAN_ROOT_QUERY, statement_id=statement_id)
+            row = await cursor.fetchone()
+            await cursor.execute(PLAN_CLEANUP_QUERY, statement_id=statement_id)
+        except oracledb.DatabaseError as e:
+            return explain_failed(e)
+    return row
+
+
+def explain_failed(e: oracledb.DatabaseError):
+    error, = e.args
+    if is_call_timeout(error):
+        raise AppException(ErrorCodes.QUERY_TIMEOUT, 408)
+    # The statement itself reports the error with its offset once it runs
+    return None
+
+
+def estimate_statement(oracle_conn: oracledb.Connection, query: str) -> tuple | None:
+    key = normalize_statement(query)
+    estimate = plan_cache.get(key)
+    if estimate is MISSING:
+        estimate = explain_statement(oracle_conn, query)
+        plan_cache.set(key, estimate)
+    return estimate
+
+
+def is_over_limit(estimate: tuple) -> bool:
+    cost, cardinality = estimate
+    return (cost or 0) > PLAN_MAX_COST or (cardinality or 0) > PLAN_MAX_CARDINALITY
+
+
+def check_statement_cost(oracle_conn: oracledb.Connection, query: str, allow_cap: bool = True) -> int | None:
+    """Returns a row cap for statements over the plan thresholds, or raises when they can't be capped."""
+    if not PLAN_CHECK:
+        return None
+    return apply_plan_limits(estimate_statement(oracle_conn, query), allow_cap)
+
+
+async def check_statement_cost_async(oracle_conn: oracledb.AsyncConnection, query: str,
+                                     allow_cap: bool = True) -> int | None:
+    if not PLAN_CHECK:
+        return None
+
+    key = normalize_statement(query)
+    estimate = plan_cache.get(key)
+    if estimate is MISSING:
+        estimate = await explain_statement_async(oracle_conn, query)
+        plan_cache.set(key, estimate)
+    return apply_plan_limits(estimate, allow_cap)
+
+
+def apply_plan_limits(estimate: tuple | None, allow_cap: bool) -> int | None:
+    if estimate is None or not is_over_limit(estimate):
+        return None
+
+    if allow_cap and PLAN_OVER_LIMIT_ACTION == CAP:
+        counters.increment("plan_check.capped")
+        return PLAN_CAPPED_ROWS
+
+    counters.increment("plan_check.rejected")
+    raise AppException(ErrorCodes.QUERY_TOO_EXPENSIVE, 400)
+
+
+def fetch_last_statement(cursor) -> tuple:
+    cursor.execute("SELECT prev_sql_id, prev_child_number FROM v$session WHERE sid = SYS_CONTEXT('USERENV', 'SID')")
+    return cursor.fetchone()
+
+
+def fetch_plan_statistics(cursor, sql_id: str, child_number: int) -> dict:
+    cursor.execute("""
+        SELECT id, parent_id, depth, operation, options, object_name, cost, cardinality, last_starts,
+               last_output_rows, last_cr_buffer_gets + last_cu_buffer_gets, last_disk_reads, last_elapsed_time
+        FROM v$sql_plan_statistics_all
+        WHERE sql_id = :sql_id AND child_number = :child_number
+        ORDER BY id
+    """, sql_id=sql_id, child_number=child_number)
+    steps = [dict(zip(PLAN_STEP_COLUMNS, row)) for row in cursor.fetchall()]
+
+    cursor.execute("SELECT plan_table_output FROM TABLE(DBMS_XPLAN.DISPLAY_CURSOR(:sql_id, :child_number, "
+                   "'ALLSTATS LAST'))", sql_id=sql_id, child_number=child_number)
+    plan = [row[0] for row in cursor.fetchall()]
+
+    return {
+        "sql_id": sql_id,
+        "child_number": child_number,
+        "steps": steps,
+        "plan": plan,
+    }
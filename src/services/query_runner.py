@@ -1,51 +1,152 @@
 import json
-import re
-from collections import Counter
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import oracledb
+from decouple import config
 
 from src.exceptions.exceptions import AppException
-from src.repositories.exercise_history import make_dict_json_serializable
-from src.schemas.query import QuerySchema, ValidateQuerySchema
+from src.oracle_db import acquire_spare_conn, release_spare_conn, is_call_timeout, GRADING
+from src.schemas.query import QuerySchema, ValidateQuerySchema, QueryPageSchema
+from src.services.dml_preview import delta_preview_enabled, capture_dml_delta, net_delta_rows, DELTA_KEYS
+from src.services.dml_sandbox import execute_dml
+from src.services.query_plan import check_statement_cost, fetch_last_statement, fetch_plan_statistics
+from src.services.result_cache import select_statement_key, get_cached_result, store_result
+from src.services.result_comparator import StreamingResultComparator, columns_verdict, too_large_verdict, \
+    COMPARE_BATCH_SIZE, COMPARE_MAX_ROWS, COMPARE_SAMPLE_SIZE, COMPARE_PREVIEW_ROWS
 from src.utils.contants import ErrorCodes
+from src.utils.result_format import prepare_unique_cols
+from src.utils.single_flight import single_flight
+from src.utils.sql_lexer import classify_statement, leading_keyword, declares_plsql, TCL_KEYWORDS, QUERY_KEYWORDS, \
+    add_hint
 
+PUSHDOWN_ROW_THRESHOLD = config("PUSHDOWN_ROW_THRESHOLD", default=5000, cast=int)
+PARALLEL_VALIDATION = config("ORACLE_PARALLEL_VALIDATION", default=True, cast=bool)
+PARALLEL_VALIDATION_WORKERS = config("ORACLE_PARALLEL_VALIDATION_WORKERS", default=4, cast=int)
 
-def extract_table_from_dml(query: str):
-    match = re.search(r"(?:INSERT\s+INTO|UPDATE|DELETE\s+(?:FROM)?)\s+([a-zA-Z0-9_$#]+)", query, re.IGNORECASE)
-    return match.group(1).upper() if match else None
+RUNNER_MAX_ROWS = config("RUNNER_MAX_ROWS", default=1000, cast=int)
+RUNNER_MAX_BYTES = config("RUNNER_MAX_BYTES", default=2 * 1024 * 1024, cast=int)
 
+COMPARE_ERROR_MESSAGE = "SQL Error: {message}; Offset: {offset}"
 
-def get_clean_rows(raw_cols, cursor):
-    unique_cols = []
-    col_counts = {}
+validation_executor = ThreadPoolExecutor(max_workers=PARALLEL_VALIDATION_WORKERS,
+                                         thread_name_prefix="teacher-query")
 
-    for col in raw_cols:
-        if col in col_counts:
-            col_counts[col] += 1
-            unique_cols.append(f"{col}_{col_counts[col]}")
-        else:
-            col_counts[col] = 0
-            unique_cols.append(col)
 
-    raw_rows = [dict(zip(unique_cols, row)) for row in cursor]
-    clean_rows = make_dict_json_serializable(raw_rows)
-    return {"columns": unique_cols, "rows": clean_rows}
+def raise_if_timeout(e: oracledb.DatabaseError):
+    error, = e.args
+    if is_call_timeout(error):
+        raise AppException(ErrorCodes.QUERY_TIMEOUT, 408)
+
+
+def raise_sql_error(e: oracledb.DatabaseError, message: str = "Error SQL: {message} Offset: {offset}"):
+    raise_if_timeout(e)
+    error, = e.args
+    raise AppException(message.format(message=error.message.strip(), offset=error.offset), 400)
+
+
+def error_verdict(key: str, **params):
+    return {"validation": {"status": "error", "message": json.dumps({"key": key, "params": params})}}
+
+
+def rollback(oracle_conn: oracledb.Connection):
+    try:
+        oracle_conn.rollback()
+    except oracledb.DatabaseError as e:
+        error, = e.args
+        if not is_call_timeout(error):
+            raise
+
+
+def extract_table_from_dml(query: str):
+    return classify_statement(query).target_table
+
+
+class CleanRows:
+    """Keeps fetched rows until the row or the payload budget runs out."""
+
+    def __init__(self, raw_cols, max_rows: int = RUNNER_MAX_ROWS, max_bytes: int = RUNNER_MAX_BYTES):
+        self.columns = prepare_unique_cols(raw_cols)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.arraysize = min(max_rows + 1, COMPARE_BATCH_SIZE)
+        self.rows = []
+        self.truncated = False
+
+        self._row_overhead = sum(len(col) + 6 for col in self.columns)
+        self._payload_size = 0
+
+    def feed(self, batch) -> bool:
+        """Adds a fetched batch and returns whether more rows are wanted."""
+        if not batch:
+            return False
+        for row in batch:
+            self._payload_size += self._row_overhead + sum(len(str(value)) for value in row)
+            # The first row always goes out, a page that can't hold one would hand back the same offset forever
+            if len(self.rows) >= self.max_rows or (self.rows and self._payload_size > self.max_bytes):
+                self.truncated = True
+                return False
+            self.rows.append(row)
+        return True
+
+    def result(self) -> dict:
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "truncated": self.truncated,
+            "total_rows": None if self.truncated else len(self.rows),
+        }
+
+
+def get_clean_rows(raw_cols, cursor, max_rows: int = RUNNER_MAX_ROWS, max_bytes: int = RUNNER_MAX_BYTES):
+    clean_rows = CleanRows(raw_cols, max_rows, max_bytes)
+    cursor.arraysize = clean_rows.arraysize
+    while clean_rows.feed(cursor.fetchmany()):
+        pass
+    return clean_rows.result()
 
 
 def run_query_match(db: oracledb.Connection, query: QuerySchema):
     check_for_ddl(query.query)
     check_for_tcl(query.query)
+    check_is_query(query.query)
 
-    matches = ['update', 'delete', 'insert', 'alter', 'drop']
-    words = re.findall("\w+", query.query)
-    if any(word.lower() in matches for word in words):
+    if check_is_dml(query.query):
+        check_statement_cost(db, query.query, allow_cap=False)
         result = run_dml_query(db, query)
     else:
-        result = run_select_query(db, query)
+        result = run_cached_select_query(db, query)
 
     return result
 
 
+def run_cached_select_query(oracle_conn: oracledb.Connection, query: QuerySchema):
+    cache_key = select_statement_key(query.query)
+    if cache_key is None:
+        return run_capped_select_query(oracle_conn, query)
+
+    cached_result = get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    result = single_flight.do(("select", *cache_key), run_and_cache_select_query, oracle_conn, query, cache_key)
+    return dict(result)
+
+
+def run_and_cache_select_query(oracle_conn: oracledb.Connection, query: QuerySchema, cache_key: tuple):
+    result = run_capped_select_query(oracle_conn, query)
+    store_result(cache_key, result)
+    return result
+
+
+def run_capped_select_query(oracle_conn: oracledb.Connection, query: QuerySchema):
+    row_cap = check_statement_cost(oracle_conn, query.query)
+    result = run_select_query(oracle_conn, query, max_rows=row_cap or RUNNER_MAX_ROWS)
+    if row_cap:
+        result["capped"] = True
+    return result
+
+
 def run_dml_query(oracle_conn: oracledb.Connection, query: QuerySchema):
     user_query = query.query
     query_result = {"columns": [], "rows": []}
@@ -53,9 +154,11 @@ def run_dml_query(oracle_conn: oracledb.Connection, query: QuerySchema):
 
     try:
         with oracle_conn.cursor() as cursor:
-            cursor.execute(user_query)
-
             affected_table = extract_table_from_dml(user_query)
+            if affected_table and delta_preview_enabled():
+                return delta_preview(capture_dml_delta(cursor, user_query, affected_table))
+
+            affected_table = execute_dml(cursor, user_query, affected_table)
             if affected_table:
                 try:
                     preview_query = f"SELECT * FROM {affected_table}"
@@ -65,27 +168,37 @@ def run_dml_query(oracle_conn: oracledb.Connection, query: QuerySchema):
                     if cursor.description:
                         raw_cols = [col[0] for col in cursor.description]
                         query_result = get_clean_rows(raw_cols, cursor)
-                except oracledb.DatabaseError:
+                except oracledb.DatabaseError as e:
+                    raise_if_timeout(e)
                     status_msg += ErrorCodes.VISUALIZATION_ERROR
 
+    except AppException:
+        raise
+
     except oracledb.DatabaseError as e:
-        error, = e.args
-        raise AppException(f"Error SQL: {error.message.strip()}", 400)
+        raise_sql_error(e, "Error SQL: {message}")
 
     except Exception as e:
         raise AppException(f"Error server: {str(e)}", 500)
 
     finally:
 
-        oracle_conn.rollback()
+        rollback(oracle_conn)
 
     return query_result
 
 
-def run_select_query(oracle_conn: oracledb.Connection, query: QuerySchema):
+def delta_preview(delta: dict):
+    preview = {"columns": prepare_unique_cols(delta["columns"])}
+    for key in DELTA_KEYS:
+        preview[key] = delta[key][:RUNNER_MAX_ROWS]
+        preview[f"{key}_count"] = len(delta[key])
+    return preview
+
+
+def run_select_query(oracle_conn: oracledb.Connection, query: QuerySchema, max_rows: int = RUNNER_MAX_ROWS):
     user_query = query.query
     status = "error"
-    error_message = None
     query_result = {"columns": [], "rows": []}
 
     try:
@@ -94,17 +207,15 @@ def run_select_query(oracle_conn: oracledb.Connection, query: QuerySchema):
 
             if cursor.description:
                 raw_cols = [col[0] for col in cursor.description]
-                query_result = get_clean_rows(raw_cols, cursor)
+                query_result = get_clean_rows(raw_cols, cursor, max_rows=max_rows)
+                query_result["next_offset"] = len(query_result["rows"]) if query_result["truncated"] else None
                 status = "success"
             else:
                 status = "success"
                 query_result = {"message": "No data returned"}
 
     except oracledb.DatabaseError as e:
-        error, = e.args
-        error_message = error.message.strip()
-        error_offset = error.offset
-        raise AppException(f"Error SQL: {error_message} Offset: {error_offset}", 400)
+        raise_sql_error(e)
 
     if status == "error":
         raise AppException("Error SQL: invalid SQL statement", 400)
@@ -112,6 +223,71 @@ def run_select_query(oracle_conn: oracledb.Connection, query: QuerySchema):
     return query_result
 
 
+def run_select_page(oracle_conn: oracledb.Connection, page: QueryPageSchema):
+    check_for_ddl(page.query)
+    check_for_tcl(page.query)
+    check_is_query(page.query)
+    if check_is_dml(page.query):
+        raise AppException(ErrorCodes.PAGE_REQUIRES_SELECT, 400)
+
+    limit = min(page.limit or RUNNER_MAX_ROWS, check_statement_cost(oracle_conn, page.query) or RUNNER_MAX_ROWS)
+    paged_query = f"SELECT * FROM ({page.query}) OFFSET :row_offset ROWS FETCH NEXT :row_limit ROWS ONLY"
+
+    try:
+        with oracle_conn.cursor() as cursor:
+            try:
+                cursor.execute(paged_query, row_offset=page.offset, row_limit=limit + 1)
+            except oracledb.DatabaseError as e:
+                raise_if_timeout(e)
+                cursor.execute(page.query)
+                skipped = 0
+                while skipped < page.offset:
+                    batch = cursor.fetchmany(min(page.offset - skipped, COMPARE_BATCH_SIZE))
+                    if not batch:
+                        break
+                    skipped += len(batch)
+
+            raw_cols = [col[0] for col in cursor.description]
+            query_result = get_clean_rows(raw_cols, cursor, max_rows=limit)
+
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e)
+
+    query_result["offset"] = page.offset
+    query_result["next_offset"] = page.offset + len(query_result["rows"]) if query_result["truncated"] else None
+    return query_result
+
+
+def run_explain_query(oracle_conn: oracledb.Connection, query: QuerySchema):
+    check_for_ddl(query.query)
+    check_for_tcl(query.query)
+    check_is_query(query.query)
+    if check_is_dml(query.query):
+        raise AppException(ErrorCodes.EXPLAIN_REQUIRES_SELECT, 400)
+
+    max_rows = check_statement_cost(oracle_conn, query.query) or RUNNER_MAX_ROWS
+
+    try:
+        started = time.perf_counter()
+        # Row source statistics are only complete once the cursor is closed
+        with oracle_conn.cursor() as cursor:
+            cursor.execute(add_hint(query.query, "GATHER_PLAN_STATISTICS"))
+            raw_cols = [col[0] for col in cursor.description]
+            query_result = get_clean_rows(raw_cols, cursor, max_rows=max_rows)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with oracle_conn.cursor() as cursor:
+            sql_id, child_number = fetch_last_statement(cursor)
+            statistics = fetch_plan_statistics(cursor, sql_id, child_number)
+
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e)
+
+    statistics["elapsed_ms"] = round(elapsed_ms, 3)
+    query_result["statistics"] = statistics
+    return query_result
+
+
 def make_json_serializable(data):
     import datetime
     if isinstance(data, (datetime.date, datetime.datetime)):
@@ -119,217 +295,397 @@ def make_json_serializable(data):
     return data
 
 
-def prepare_unique_cols(raw_cols):
-    unique_cols = []
-    col_counts = {}
-
-    for col in raw_cols:
-        if col in col_counts:
-            col_counts[col] += 1
-            unique_cols.append(f"{col}_{col_counts[col]}")
-        else:
-            col_counts[col] = 0
-            unique_cols.append(col)
-    return unique_cols
-
-
 def check_for_ddl(query: str):
-    matches = ["create", "drop", "alter", "truncate"]
-    words = re.findall(r"\w+", query)
-    if any(word.lower() in matches for word in words):
+    if classify_statement(query).kind == "ddl":
         raise AppException(ErrorCodes.DDL_COMMANDS, 403)
 
 
 def check_for_tcl(query: str):
-    matches = ["commit", "savepoint", "rollback"]
-    words = re.findall(r"\w+", query)
-    if any(word.lower() in matches for word in words):
+    if any(word in TCL_KEYWORDS for word in classify_statement(query).forbidden_keywords):
         raise AppException(ErrorCodes.TCL_COMMANDS, 403)
 
 
+def check_is_query(query: str):
+    # Literals are skipped by the lexer, a PL/SQL block can hide any statement inside EXECUTE IMMEDIATE
+    if leading_keyword(query) not in QUERY_KEYWORDS or declares_plsql(query):
+        raise AppException(ErrorCodes.STATEMENT_NOT_ALLOWED, 403)
+
+
 def check_is_dml(query: str):
-    matches = ['update', 'delete', 'insert', 'alter', 'drop']
-    words = re.findall(r"\w+", query)
-    if any(word.lower() in matches for word in words):
-        return True
-    return False
+    return classify_statement(query).is_dml
+
+
+class ExpectedRows:
+    """Collects the teacher's rows, dropping them once the result can be compared in the database or is too large.
+
+    Without rows the stored result only marks the exercise for a live comparison.
+    """
+
+    def __init__(self, description, teacher_query: str, is_dml: bool, target_table: str | None):
+        self.columns = [col[0].lower() for col in description]
+        self.has_order = classify_statement(teacher_query).has_order_by
+        self.is_dml = is_dml
+        self.target_table = target_table
+        self.rows = []
+        self.row_count = 0
+
+        self._can_push_down = not is_dml and not self.has_order
+
+    def feed(self, batch):
+        self.row_count += len(batch)
+        if self.rows is not None:
+            self.rows.extend(batch)
+            if self.row_count > COMPARE_MAX_ROWS or (self._can_push_down and self.row_count > PUSHDOWN_ROW_THRESHOLD):
+                self.rows = None
+
+    def result(self) -> dict:
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "row_count": self.row_count,
+            "has_order": self.has_order,
+            "is_dml": self.is_dml,
+            "is_delta": False,
+            "target_table": self.target_table,
+        }
 
 
-def compare_queries(oracle_conn: oracledb.Connection, query: ValidateQuerySchema):
-    user_query = query.user_query
-    teacher_query = query.correct_query
+def build_expected_result(cursor, teacher_query: str, is_dml: bool, target_table: str | None):
+    if is_dml and delta_preview_enabled():
+        return delta_expected_result(capture_dml_delta(cursor, teacher_query, target_table), target_table)
 
-    check_for_ddl(user_query)
-    check_for_ddl(teacher_query)
+    if is_dml:
+        result_table = execute_dml(cursor, teacher_query, target_table)
+        cursor.execute(f"SELECT * FROM {result_table}")
+    else:
+        cursor.execute(teacher_query)
 
-    check_for_tcl(user_query)
+    expected_rows = ExpectedRows(cursor.description, teacher_query, is_dml, target_table)
+    cursor.arraysize = COMPARE_BATCH_SIZE
+    for batch in fetch_batches(cursor):
+        expected_rows.feed(batch)
+    return expected_rows.result()
+
+
+def delta_expected_result(delta: dict, target_table: str):
+    rows = net_delta_rows(delta)
+    return {
+        "columns": delta_columns(delta),
+        "rows": rows if len(rows) <= COMPARE_MAX_ROWS else None,
+        "row_count": len(rows),
+        "has_order": False,
+        "is_dml": True,
+        "is_delta": True,
+        "target_table": target_table,
+    }
+
+
+def delta_columns(delta: dict):
+    return ["change"] + [col.lower() for col in delta["columns"]]
+
+
+def expected_result_target(teacher_query: str) -> tuple[bool, str | None]:
+    check_for_ddl(teacher_query)
     check_for_tcl(teacher_query)
+    check_is_query(teacher_query)
+
+    is_dml = check_is_dml(teacher_query)
+    target_table = extract_table_from_dml(teacher_query) if is_dml else None
+    if is_dml and not target_table:
+        raise AppException(ErrorCodes.ERR_DML_NO_TABLE, 400)
+    return is_dml, target_table
 
-    is_dml = check_is_dml(query.correct_query)
+
+def compute_expected_result(oracle_conn: oracledb.Connection, teacher_query: str):
+    is_dml, target_table = expected_result_target(teacher_query)
 
     try:
         with oracle_conn.cursor() as cursor:
-            if is_dml:
-                target_table = extract_table_from_dml(teacher_query)
-                user_target_table = extract_table_from_dml(user_query)
-
-                if not target_table:
-                    return {"validation": {"status": "error",
-                                           "message": ErrorCodes.ERR_DML_NO_TABLE}}
-
-                if user_target_table != target_table:
-                    error_payload = {
-                        "key": ErrorCodes.ERR_DML_WRONG_TABLE,
-                        "params": {
-                            "expected": target_table,
-                            "actual": user_target_table
-                        }
-                    }
-                    return {"validation": {"status": "error",
-                                           "message": json.dumps(error_payload)}}
+            return build_expected_result(cursor, teacher_query, is_dml, target_table)
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e)
+    finally:
+        rollback(oracle_conn)
 
-                try:
-                    teacher_cols, teacher_rows = get_table_state_after_dml(cursor, teacher_query, target_table)
-                except Exception as e:
-                    error_payload = {
-                        "key": ErrorCodes.ERR_TEACHER_SOL,
-                        "params": {
-                            "err": str(e)
-                        }
-                    }
-                    return {"validation": {"status": "error", "message": json.dumps(error_payload)}}
-                finally:
-                    oracle_conn.rollback()
 
-                try:
-                    user_cols, user_rows = get_table_state_after_dml(cursor, user_query, target_table)
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    error_payload = {
-                        "key": ErrorCodes.SQL_ERROR,
-                        "params": {
-                            "err": error.message.strip()
-                        }
-                    }
-                    return {"validation": {"status": "error", "message": json.dumps(error_payload)}}
-                finally:
-                    oracle_conn.rollback()
+def compare_queries(oracle_conn: oracledb.Connection, query: ValidateQuerySchema, expected: dict | None = None):
+    user_query = query.user_query
+    teacher_query = query.correct_query
 
-            else:
-                cursor.execute(teacher_query)
-                teacher_cols = [col[0].lower() for col in cursor.description]
-                teacher_rows = cursor.fetchall()
+    check_for_ddl(user_query)
+    check_for_tcl(user_query)
+    check_is_query(user_query)
+    check_statement_cost(oracle_conn, user_query, allow_cap=False)
+    is_dml, target_table, expected = comparison_target(teacher_query, expected)
+
+    try:
+        with oracle_conn.cursor() as cursor:
+            if is_dml:
+                return compare_dml(oracle_conn, cursor, query, expected, target_table)
 
-                teacher_has_order = "order by" in teacher_query.lower()
+            if expected is not None and should_push_down(expected):
+                verdict = compare_in_database(cursor, teacher_query, user_query, expected)
+                if verdict is not None:
+                    return verdict
+                expected = None
 
+            if expected is not None:
                 cursor.execute(user_query)
-                user_cols = [col[0].lower() for col in cursor.description]
-                user_rows = cursor.fetchall()
-
-            if user_cols != teacher_cols:
-                if set(user_cols) == set(teacher_cols):
-                    return {
-                        "validation": {
-                            "status": "error",
-                            "type": "column",
-                            "message": ErrorCodes.COLUMNS_ORDER_WRONG,
-                            "missing_columns": [],
-                            "extra_columns": []
-                        }
-                    }
-
-                return {
-                    "validation": {
-                        "status": "error",
-                        "type": "column",
-                        "message": ErrorCodes.COLUMNS_DOES_NOT_MATCH,
-                        "missing_columns": list(set(teacher_cols) - set(user_cols)),
-                        "extra_columns": list(set(user_cols) - set(teacher_cols))
-                    }
-                }
-            unique_cols = prepare_unique_cols(user_cols)
-
-            raw_rows = [dict(zip(unique_cols, row)) for row in user_rows]
-            clean_rows = make_dict_json_serializable(raw_rows)
-            if user_rows == teacher_rows:
-                return {
-                    "validation": {"status": "success",
-                                   "message": "Correct!",
-                                   "rows_count": len(user_rows),
-                                   "columns_count": len(user_cols),
-                                   "rows": clean_rows,
-                                   "columns": list(user_cols)
-                                   }}
-
-            teacher_counter = Counter(teacher_rows)
-            user_counter = Counter(user_rows)
-
-            missing_counter = teacher_counter - user_counter
-            extra_counter = user_counter - teacher_counter
-
-            if len(missing_counter) == 0 and len(extra_counter) == 0:
-                if teacher_has_order:
-                    return {
-                        "validation": {
-                            "status": "error",
-                            "message": ErrorCodes.RESULTS_ORDER_WRONG
-                        }
-                    }
-                else:
-                    return {"validation": {"status": "success",
-                                           "message": "Correct!",
-                                           "rows_count": len(user_rows),
-                                           "columns_count": len(user_cols),
-                                           "rows": clean_rows,
-                                           "columns": list(user_cols)
-                                           }}
-
-            missing_rows_sample = []
-            for row_tuple, count in missing_counter.items():
-                row_dict = dict(zip(teacher_cols, row_tuple))
-                missing_rows_sample.append(make_dict_json_serializable(row_dict))
-
-            extra_rows_sample = []
-            for row_tuple, count in extra_counter.items():
-                row_dict = dict(zip(user_cols, row_tuple))
-                extra_rows_sample.append(make_dict_json_serializable(row_dict))
-
-            missing_total = len(missing_counter.values())
-            extra_total = len(extra_counter.values())
-            return {
-                "validation": {
-                    "status": "error",
-                    "type": "row",
-                    "message": ErrorCodes.RESULTS_WRONG,
-                    "columns": user_cols,
-                    "missing_rows_count": missing_total,
-                    "extra_rows_count": extra_total,
-                    "missing_rows_sample": missing_rows_sample,
-                    "extra_rows_sample": extra_rows_sample
-                }
-            }
+                return compare_with_expected(expected, cursor)
+
+            return compare_live(oracle_conn, cursor, teacher_query, user_query)
+
+    except AppException:
+        raise
 
     except oracledb.DatabaseError as e:
-        err_obj, = e.args
-        error_message = err_obj.message.strip()
-        error_offset = err_obj.offset
-        raise AppException(f"SQL Error: {error_message}; Offset: {error_offset}", 400)
+        raise_sql_error(e, COMPARE_ERROR_MESSAGE)
 
     except Exception as e:
-        error_payload = {
-            "key": ErrorCodes.SERVER_ERROR,
-            "params": {
-                "err": str(e)
-            }
-        }
-        return {"validation": {"status": "error", "message": json.dumps(error_payload)}}
+        return error_verdict(ErrorCodes.SERVER_ERROR, err=str(e))
+
+
+def comparison_target(teacher_query: str, expected: dict | None) -> tuple:
+    """Returns whether the teacher's query is DML, its target table and the stored result if it still applies."""
+    if expected is None:
+        check_for_ddl(teacher_query)
+        check_for_tcl(teacher_query)
+        check_is_query(teacher_query)
+        is_dml = check_is_dml(teacher_query)
+        return is_dml, extract_table_from_dml(teacher_query) if is_dml else None, None
+
+    if expected["is_dml"] and expected["is_delta"] != delta_preview_enabled():
+        return True, expected["target_table"], None
+    if expected["rows"] is None and not expected["is_dml"] and expected["has_order"]:
+        # Too large to store, an ordered result can only be compared against the teacher's query
+        return False, None, None
+    return expected["is_dml"], expected["target_table"], expected
+
+
+def dml_target_verdict(target_table: str | None, user_target_table: str | None):
+    if not target_table:
+        return {"validation": {"status": "error",
+                               "message": ErrorCodes.ERR_DML_NO_TABLE}}
+    if user_target_table != target_table:
+        return error_verdict(ErrorCodes.ERR_DML_WRONG_TABLE, expected=target_table, actual=user_target_table)
+    return None
+
+
+def teacher_error_verdict(e: Exception):
+    if isinstance(e, oracledb.DatabaseError):
+        raise_if_timeout(e)
+    return error_verdict(ErrorCodes.ERR_TEACHER_SOL, err=str(e))
+
+
+def user_dml_error_verdict(e: oracledb.DatabaseError):
+    raise_if_timeout(e)
+    error, = e.args
+    return error_verdict(ErrorCodes.SQL_ERROR, err=error.message.strip())
+
+
+def compare_dml(oracle_conn: oracledb.Connection, cursor, query: ValidateQuerySchema, expected: dict | None,
+                target_table: str | None):
+    target_error = dml_target_verdict(target_table, extract_table_from_dml(query.user_query))
+    if target_error:
+        return target_error
+
+    if expected is None:
+        try:
+            expected = build_expected_result(cursor, query.correct_query, True, target_table)
+        except Exception as e:
+            return teacher_error_verdict(e)
+        finally:
+            rollback(oracle_conn)
+    if expected["rows"] is None:
+        # Past the comparison limit, a live comparison would stop at the same point
+        return too_large_verdict()
+
+    try:
+        if expected["is_delta"]:
+            return compare_delta_with_expected(expected, capture_dml_delta(cursor, query.user_query, target_table))
+        result_table = execute_dml(cursor, query.user_query, target_table)
+        cursor.execute(f"SELECT * FROM {result_table}")
+        return compare_with_expected(expected, cursor)
+    except oracledb.DatabaseError as e:
+        return user_dml_error_verdict(e)
+    finally:
+        rollback(oracle_conn)
+
+
+def fetch_batches(cursor):
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        yield rows
+
+
+def list_batches(rows: list, batch_size: int = COMPARE_BATCH_SIZE):
+    for start in range(0, len(rows), batch_size):
+        yield [tuple(row) for row in rows[start:start + batch_size]]
+
+
+def compare_with_expected(expected: dict, user_cursor):
+    user_cols = [col[0].lower() for col in user_cursor.description]
+    column_error = columns_verdict(expected["columns"], user_cols)
+    if column_error:
+        return column_error
+
+    user_cursor.arraysize = COMPARE_BATCH_SIZE
+    comparator = StreamingResultComparator(expected["columns"], user_cols, expected["has_order"])
+    return comparator.consume(list_batches(expected["rows"]), fetch_batches(user_cursor))
+
 
+def compare_delta_with_expected(expected: dict, delta: dict):
+    user_cols = delta_columns(delta)
+    column_error = columns_verdict(expected["columns"], user_cols)
+    if column_error:
+        return column_error
 
-def get_table_state_after_dml(cursor, query, table_name):
-    cursor.execute(query)
-    cursor.execute(f"SELECT * FROM {table_name}")
+    comparator = StreamingResultComparator(expected["columns"], user_cols, False)
+    return comparator.consume(list_batches(expected["rows"]), list_batches(net_delta_rows(delta)))
+
+
+def compare_live(oracle_conn: oracledb.Connection, user_cursor, teacher_query: str, user_query: str):
+    teacher_has_order = classify_statement(teacher_query).has_order_by
+    spare_conn = acquire_spare_conn(GRADING, oracle_conn.call_timeout) if PARALLEL_VALIDATION else None
+
+    if spare_conn is None:
+        with oracle_conn.cursor() as teacher_cursor:
+            teacher_cursor.arraysize = COMPARE_BATCH_SIZE
+            teacher_cursor.execute(teacher_query)
+            user_cursor.execute(user_query)
+            return compare_cursors(teacher_cursor, user_cursor, teacher_has_order)
+
+    timed_out = False
+    try:
+        with spare_conn.cursor() as teacher_cursor:
+            teacher_cursor.arraysize = COMPARE_BATCH_SIZE
+            teacher_future = validation_executor.submit(teacher_cursor.execute, teacher_query)
+
+            user_error = None
+            try:
+                user_cursor.execute(user_query)
+            except oracledb.DatabaseError as e:
+                user_error = e
+
+            teacher_future.result()
+            if user_error:
+                raise user_error
+
+            return compare_cursors(teacher_cursor, user_cursor, teacher_has_order)
+    except oracledb.DatabaseError as e:
+        error, = e.args
+        timed_out = is_call_timeout(error)
+        raise
+    finally:
+        release_spare_conn(GRADING, spare_conn, drop=timed_out)
+
+
+def compare_cursors(teacher_cursor, user_cursor, teacher_has_order: bool):
+    teacher_cols = [col[0].lower() for col in teacher_cursor.description]
+    user_cols = [col[0].lower() for col in user_cursor.description]
+    column_error = columns_verdict(teacher_cols, user_cols)
+    if column_error:
+        return column_error
+
+    user_cursor.arraysize = COMPARE_BATCH_SIZE
+    comparator = StreamingResultComparator(teacher_cols, user_cols, teacher_has_order)
+    return comparator.consume(fetch_batches(teacher_cursor), fetch_batches(user_cursor))
+
+
+def should_push_down(expected: dict):
+    if expected["is_dml"] or expected["has_order"]:
+        return False
+    return expected["rows"] is None or expected["row_count"] > PUSHDOWN_ROW_THRESHOLD
+
+
+def build_pushdown_query(teacher_query: str, user_query: str, raw_cols: list):
+    cols = ", ".join(f'"{col}"' for col in raw_cols)
+    return f"""
+        WITH diff AS (
+            SELECT {cols}, SUM(side__) AS balance__
+            FROM (
+                SELECT {cols}, 1 AS side__ FROM ({teacher_query})
+                UNION ALL
+                SELECT {cols}, -1 AS side__ FROM ({user_query})
+            )
+            GROUP BY {cols}
+        ),
+        ranked AS (
+            SELECT diff.*,
+                   SUM(CASE WHEN balance__ > 0 THEN 1 ELSE 0 END) OVER () AS missing_total__,
+                   SUM(CASE WHEN balance__ < 0 THEN 1 ELSE 0 END) OVER () AS extra_total__,
+                   ROW_NUMBER() OVER (PARTITION BY SIGN(balance__) ORDER BY NULL) AS rn__
+            FROM diff
+            WHERE balance__ <> 0
+        )
+        SELECT * FROM ranked WHERE rn__ <= :sample_size
+    """
+
+
+def compare_in_database(cursor, teacher_query: str, user_query: str, expected: dict):
+    cursor.parse(user_query)
+    raw_cols = [col[0] for col in cursor.description]
+    user_cols = [col.lower() for col in raw_cols]
+
+    column_error = columns_verdict(expected["columns"], user_cols)
+    if column_error:
+        return column_error
+    if len(set(user_cols)) != len(user_cols):
+        return None
+
+    try:
+        cursor.execute(build_pushdown_query(teacher_query, user_query, raw_cols), sample_size=COMPARE_SAMPLE_SIZE)
+        diff_rows = cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        raise_if_timeout(e)
+        return None
+
+    row_error = pushdown_diff_verdict(diff_rows, user_cols)
+    if row_error:
+        return row_error
+
+    cursor.execute(user_query)
+    return pushdown_success(expected, user_cols, cursor.fetchmany(COMPARE_PREVIEW_ROWS))
+
+
+def pushdown_diff_verdict(diff_rows: list, user_cols: list):
+    column_count = len(user_cols)
+    missing_total = 0
+    extra_total = 0
+    missing_rows_sample = []
+    extra_rows_sample = []
+    for row in diff_rows:
+        values = row[:column_count]
+        balance, missing_total, extra_total = row[column_count:column_count + 3]
+        if balance > 0:
+            missing_rows_sample.append(values)
+        else:
+            extra_rows_sample.append(values)
+
+    if not missing_total and not extra_total:
+        return None
+
+    return {
+        "validation": {
+            "status": "error",
+            "type": "row",
+            "message": ErrorCodes.RESULTS_WRONG,
+            "columns": user_cols,
+            "missing_rows_count": missing_total,
+            "extra_rows_count": extra_total,
+            "missing_rows_sample": missing_rows_sample,
+            "extra_rows_sample": extra_rows_sample
+        }
+    }
 
-    cols = [col[0].lower() for col in cursor.description]
-    rows = cursor.fetchall()
 
-    return cols, rows
+def pushdown_success(expected: dict, user_cols: list, preview: list):
+    return {"validation": {"status": "success",
+                           "message": "Correct!",
+                           "rows_count": expected["row_count"],
+                           "columns_count": len(user_cols),
+                           "rows": preview,
+                           "columns": list(user_cols)
+                           }}
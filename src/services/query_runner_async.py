@@ -0,0 +1,307 @@
+import oracledb
+
+from src.exceptions.exceptions import AppException
+from src.oracle_db import is_call_timeout
+from src.schemas.query import QuerySchema, ValidateQuerySchema
+from src.services.dml_preview import delta_preview_enabled, capture_dml_delta_async
+from src.services.dml_sandbox import execute_dml_async
+from src.services.query_plan import check_statement_cost_async
+from src.services.query_runner import check_for_ddl, check_for_tcl, check_is_query, check_is_dml, \
+    extract_table_from_dml, raise_if_timeout, raise_sql_error, error_verdict, should_push_down, \
+    build_pushdown_query, pushdown_diff_verdict, pushdown_success, list_batches, CleanRows, ExpectedRows, \
+    delta_preview, delta_expected_result, expected_result_target, comparison_target, dml_target_verdict, \
+    teacher_error_verdict, user_dml_error_verdict, compare_delta_with_expected, RUNNER_MAX_ROWS, RUNNER_MAX_BYTES, \
+    COMPARE_ERROR_MESSAGE
+from src.services.result_cache import select_statement_key, get_cached_result, store_result
+from src.services.result_comparator import StreamingResultComparator, columns_verdict, too_large_verdict, \
+    COMPARE_BATCH_SIZE, COMPARE_SAMPLE_SIZE, COMPARE_PREVIEW_ROWS
+from src.utils.contants import ErrorCodes
+from src.utils.single_flight import single_flight
+from src.utils.sql_lexer import classify_statement
+
+
+async def rollback_async(oracle_conn: oracledb.AsyncConnection):
+    try:
+        await oracle_conn.rollback()
+    except oracledb.DatabaseError as e:
+        error, = e.args
+        if not is_call_timeout(error):
+            raise
+
+
+async def get_clean_rows_async(raw_cols, cursor, max_rows: int = RUNNER_MAX_ROWS,
+                               max_bytes: int = RUNNER_MAX_BYTES):
+    clean_rows = CleanRows(raw_cols, max_rows, max_bytes)
+    cursor.arraysize = clean_rows.arraysize
+    while clean_rows.feed(await cursor.fetchmany()):
+        pass
+    return clean_rows.result()
+
+
+async def run_query_match_async(db: oracledb.AsyncConnection, query: QuerySchema):
+    check_for_ddl(query.query)
+    check_for_tcl(query.query)
+    check_is_query(query.query)
+
+    if check_is_dml(query.query):
+        await check_statement_cost_async(db, query.query, allow_cap=False)
+        return await run_dml_query_async(db, query)
+    return await run_cached_select_query_async(db, query)
+
+
+async def run_cached_select_query_async(oracle_conn: oracledb.AsyncConnection, query: QuerySchema):
+    cache_key = select_statement_key(query.query)
+    if cache_key is None:
+        return await run_capped_select_query_async(oracle_conn, query)
+
+    cached_result = get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    result = await single_flight.do_async(("select", *cache_key), run_and_cache_select_query_async, oracle_conn,
+                                          query, cache_key)
+    return dict(result)
+
+
+async def run_and_cache_select_query_async(oracle_conn: oracledb.AsyncConnection, query: QuerySchema,
+                                           cache_key: tuple):
+    result = await run_capped_select_query_async(oracle_conn, query)
+    store_result(cache_key, result)
+    return result
+
+
+async def run_capped_select_query_async(oracle_conn: oracledb.AsyncConnection, query: QuerySchema):
+    row_cap = await check_statement_cost_async(oracle_conn, query.query)
+    result = await run_select_query_async(oracle_conn, query, max_rows=row_cap or RUNNER_MAX_ROWS)
+    if row_cap:
+        result["capped"] = True
+    return result
+
+
+async def run_dml_query_async(oracle_conn: oracledb.AsyncConnection, query: QuerySchema):
+    query_result = {"columns": [], "rows": []}
+
+    try:
+        with oracle_conn.cursor() as cursor:
+            affected_table = extract_table_from_dml(query.query)
+            if affected_table and delta_preview_enabled():
+                return delta_preview(await capture_dml_delta_async(cursor, query.query, affected_table))
+
+            affected_table = await execute_dml_async(cursor, query.query, affected_table)
+            if affected_table:
+                try:
+                    await cursor.execute(f"SELECT * FROM {affected_table}")
+                    if cursor.description:
+                        raw_cols = [col[0] for col in cursor.description]
+                        query_result = await get_clean_rows_async(raw_cols, cursor)
+                except oracledb.DatabaseError as e:
+                    raise_if_timeout(e)
+
+    except AppException:
+        raise
+
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e, "Error SQL: {message}")
+
+    except Exception as e:
+        raise AppException(f"Error server: {str(e)}", 500)
+
+    finally:
+        await rollback_async(oracle_conn)
+
+    return query_result
+
+
+async def run_select_query_async(oracle_conn: oracledb.AsyncConnection, query: QuerySchema,
+                                 max_rows: int = RUNNER_MAX_ROWS):
+    try:
+        with oracle_conn.cursor() as cursor:
+            await cursor.execute(query.query)
+            if not cursor.description:
+                return {"message": "No data returned"}
+
+            raw_cols = [col[0] for col in cursor.description]
+            query_result = await get_clean_rows_async(raw_cols, cursor, max_rows=max_rows)
+            query_result["next_offset"] = len(query_result["rows"]) if query_result["truncated"] else None
+            return query_result
+
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e)
+
+
+async def fetch_batches_async(cursor):
+    while True:
+        rows = await cursor.fetchmany()
+        if not rows:
+            break
+        yield rows
+
+
+async def next_batch(batches):
+    if hasattr(batches, "__anext__"):
+        return await anext(batches, None)
+    return next(batches, None)
+
+
+async def consume_async(comparator: StreamingResultComparator, teacher_batches, user_batches):
+    teacher_done = user_done = False
+    while not (teacher_done and user_done):
+        teacher_batch = None if teacher_done else await next_batch(teacher_batches)
+        user_batch = None if user_done else await next_batch(user_batches)
+        teacher_done = teacher_batch is None
+        user_done = user_batch is None
+        if not comparator.feed(teacher_batch or (), user_batch or ()):
+            break
+    return comparator.verdict()
+
+
+async def build_expected_result_async(cursor, teacher_query: str, is_dml: bool, target_table: str | None):
+    if is_dml and delta_preview_enabled():
+        return delta_expected_result(await capture_dml_delta_async(cursor, teacher_query, target_table),
+                                     target_table)
+
+    if is_dml:
+        result_table = await execute_dml_async(cursor, teacher_query, target_table)
+        await cursor.execute(f"SELECT * FROM {result_table}")
+    else:
+        await cursor.execute(teacher_query)
+
+    expected_rows = ExpectedRows(cursor.description, teacher_query, is_dml, target_table)
+    cursor.arraysize = COMPARE_BATCH_SIZE
+    async for batch in fetch_batches_async(cursor):
+        expected_rows.feed(batch)
+    return expected_rows.result()
+
+
+async def compute_expected_result_async(oracle_conn: oracledb.AsyncConnection, teacher_query: str):
+    is_dml, target_table = expected_result_target(teacher_query)
+
+    try:
+        with oracle_conn.cursor() as cursor:
+            return await build_expected_result_async(cursor, teacher_query, is_dml, target_table)
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e)
+    finally:
+        await rollback_async(oracle_conn)
+
+
+async def compare_queries_async(oracle_conn: oracledb.AsyncConnection, query: ValidateQuerySchema,
+                                expected: dict | None = None):
+    user_query = query.user_query
+    teacher_query = query.correct_query
+
+    check_for_ddl(user_query)
+    check_for_tcl(user_query)
+    check_is_query(user_query)
+    await check_statement_cost_async(oracle_conn, user_query, allow_cap=False)
+    is_dml, target_table, expected = comparison_target(teacher_query, expected)
+
+    try:
+        with oracle_conn.cursor() as cursor:
+            if is_dml:
+                return await compare_dml_async(oracle_conn, cursor, query, expected, target_table)
+
+            if expected is not None and should_push_down(expected):
+                verdict = await compare_in_database_async(cursor, teacher_query, user_query, expected)
+                if verdict is not None:
+                    return verdict
+                expected = None
+
+            if expected is not None:
+                await cursor.execute(user_query)
+                return await compare_with_expected_async(expected, cursor)
+
+            with oracle_conn.cursor() as teacher_cursor:
+                teacher_cursor.arraysize = COMPARE_BATCH_SIZE
+                await teacher_cursor.execute(teacher_query)
+                await cursor.execute(user_query)
+                return await compare_cursors_async(teacher_cursor, cursor,
+                                                   classify_statement(teacher_query).has_order_by)
+
+    except AppException:
+        raise
+
+    except oracledb.DatabaseError as e:
+        raise_sql_error(e, COMPARE_ERROR_MESSAGE)
+
+    except Exception as e:
+        return error_verdict(ErrorCodes.SERVER_ERROR, err=str(e))
+
+
+async def compare_dml_async(oracle_conn: oracledb.AsyncConnection, cursor, query: ValidateQuerySchema,
+                            expected: dict | None, target_table: str | None):
+    target_error = dml_target_verdict(target_table, extract_table_from_dml(query.user_query))
+    if target_error:
+        return target_error
+
+    if expected is None:
+        try:
+            expected = await build_expected_result_async(cursor, query.correct_query, True, target_table)
+        except Exception as e:
+            return teacher_error_verdict(e)
+        finally:
+            await rollback_async(oracle_conn)
+    if expected["rows"] is None:
+        return too_large_verdict()
+
+    try:
+        if expected["is_delta"]:
+            return compare_delta_with_expected(expected, await capture_dml_delta_async(cursor, query.user_query,
+                                                                                      target_table))
+        result_table = await execute_dml_async(cursor, query.user_query, target_table)
+        await cursor.execute(f"SELECT * FROM {result_table}")
+        return await compare_with_expected_async(expected, cursor)
+    except oracledb.DatabaseError as e:
+        return user_dml_error_verdict(e)
+    finally:
+        await rollback_async(oracle_conn)
+
+
+async def compare_with_expected_async(expected: dict, user_cursor):
+    user_cols = [col[0].lower() for col in user_cursor.description]
+    column_error = columns_verdict(expected["columns"], user_cols)
+    if column_error:
+        return column_error
+
+    user_cursor.arraysize = COMPARE_BATCH_SIZE
+    comparator = StreamingResultComparator(expected["columns"], user_cols, expected["has_order"])
+    return await consume_async(comparator, list_batches(expected["rows"]), fetch_batches_async(user_cursor))
+
+
+async def compare_cursors_async(teacher_cursor, user_cursor, teacher_has_order: bool):
+    teacher_cols = [col[0].lower() for col in teacher_cursor.description]
+    user_cols = [col[0].lower() for col in user_cursor.description]
+    column_error = columns_verdict(teacher_cols, user_cols)
+    if column_error:
+        return column_error
+
+    user_cursor.arraysize = COMPARE_BATCH_SIZE
+    comparator = StreamingResultComparator(teacher_cols, user_cols, teacher_has_order)
+    return await consume_async(comparator, fetch_batches_async(teacher_cursor), fetch_batches_async(user_cursor))
+
+
+async def compare_in_database_async(cursor, teacher_query: str, user_query: str, expected: dict):
+    await cursor.parse(user_query)
+    raw_cols = [col[0] for col in cursor.description]
+    user_cols = [col.lower() for col in raw_cols]
+
+    column_error = columns_verdict(expected["columns"], user_cols)
+    if column_error:
+        return column_error
+    if len(set(user_cols)) != len(user_cols):
+        return None
+
+    try:
+        await cursor.execute(build_pushdown_query(teacher_query, user_query, raw_cols),
+                             sample_size=COMPARE_SAMPLE_SIZE)
+        diff_rows = await cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        raise_if_timeout(e)
+        return None
+
+    row_error = pushdown_diff_verdict(diff_rows, user_cols)
+    if row_error:
+        return row_error
+
+    await cursor.execute(user_query)
+    return pushdown_success(expected, user_cols, await cursor.fetchmany(COMPARE_PREVIEW_ROWS))
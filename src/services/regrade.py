@@ -0,0 +1,299 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from decouple import config
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal
+from src.exceptions.exceptions import AppException
+from src.models.regrade_job import RegradeJob, RUNNING, DONE, FAILED
+from src.oracle_db import oracle_conn_context, oracle_admissions, AUTHORING, GRADING, WORKLOAD_POOLS
+from src.repositories.exercise import find_exercise_by_id
+from src.repositories.regrade_job import create_regrade_job_db, find_regrade_job_by_id, get_regrade_jobs_db, \
+    claim_regrade_job_db, count_regrade_rows_db, set_regrade_total_db, get_regrade_chunk_db, save_regrade_chunk_db, \
+    finish_regrade_job_db, release_regrade_job_db, touch_regrade_job_db
+from src.services.exercise import get_expected_result
+from src.services.exercise_history import grade_against_expected
+from src.services.grading_jobs import GRADING_QUEUE, grading_queue
+from src.utils.contants import ErrorCodes
+from src.utils.metrics import counters
+from src.utils.result_format import format_validation
+from src.utils.sql_lexer import statement_hash
+
+REGRADE_JOBS = config("REGRADE_JOBS", default=True, cast=bool)
+REGRADE_CHUNK_SIZE = config("REGRADE_CHUNK_SIZE", default=200, cast=int)
+# Regrades run on the authoring pool, the lowest priority, so they never take sessions from grading
+REGRADE_WORKERS = config("REGRADE_WORKERS", default=WORKLOAD_POOLS[AUTHORING]["max"], cast=int)
+REGRADE_CHUNK_DELAY = config("REGRADE_CHUNK_DELAY", default=0.5, cast=float)
+REGRADE_BACKOFF = config("REGRADE_BACKOFF", default=2.0, cast=float)
+REGRADE_POLL_INTERVAL = config("REGRADE_POLL_INTERVAL", default=5.0, cast=float)
+REGRADE_LEASE_SECONDS = config("REGRADE_LEASE_SECONDS", default=120, cast=int)
+# Several heartbeats fit in one lease, a chunk that outlasts the lease keeps it while its queries grade
+REGRADE_HEARTBEAT_INTERVAL = config("REGRADE_HEARTBEAT_INTERVAL", default=REGRADE_LEASE_SECONDS / 4, cast=float)
+REGRADE_RETRIES = config("REGRADE_RETRIES", default=3, cast=int)
+
+# A busy pool or a timeout under load says nothing about the query, those rows are graded again later
+RETRYABLE_ERRORS = (ErrorCodes.ORACLE_POOL_BUSY, ErrorCodes.QUERY_TIMEOUT)
+
+regrade_stop = threading.Event()
+regrade_wake = threading.Event()
+regrade_threads = []
+# Job id -> (monotonic start of this run, rows processed before it), used for the ETA
+regrade_runs = {}
+
+
+def schedule_regrade(db: Session, exercise_id: str) -> dict:
+    if not REGRADE_JOBS:
+        raise AppException(ErrorCodes.REGRADE_JOBS_DISABLED, 409)
+    exercise = find_exercise_by_id(exercise_id, db)
+    if exercise is None:
+        raise AppException(ErrorCodes.EXERCISE_NOT_FOUND, 404)
+    return regrade_job_to_dict(queue_regrade(db, exercise.id))
+
+
+def queue_regrade(db: Session, exercise_id) -> RegradeJob | None:
+    # Without a runner the job would stay pending forever
+    if not REGRADE_JOBS:
+        return None
+    job = create_regrade_job_db(db, exercise_id)
+    regrade_wake.set()
+    return job
+
+
+def get_regrade_job(db: Session, job_id: str) -> dict:
+    job = find_regrade_job_by_id(db, job_id)
+    if job is None:
+        raise AppException(ErrorCodes.REGRADE_JOB_NOT_FOUND, 404)
+    return regrade_job_to_dict(job)
+
+
+def get_regrade_jobs(db: Session) -> list:
+    return [regrade_job_to_dict(job) for job in get_regrade_jobs_db(db)]
+
+
+def regrade_job_to_dict(job: RegradeJob) -> dict:
+    total = job.total or 0
+    processed = job.processed or 0
+    progress = min(100.0, round(processed / total * 100, 1)) if total else (100.0 if job.status == DONE else 0.0)
+    return {
+        "id": job.id,
+        "exercise_id": job.exercise_id,
+        "status": job.status,
+        "total": total,
+        "processed": processed,
+        "changed": job.changed or 0,
+        "errors": job.errors or 0,
+        "progress": progress,
+        "eta_seconds": estimate_eta(job),
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def estimate_eta(job: RegradeJob) -> float | None:
+    if job.status != RUNNING or not job.total:
+        return None
+
+    run = regrade_runs.get(str(job.id))
+    if run is not None:
+        run_started, processed_before = run
+        done = job.processed - processed_before
+        elapsed = time.monotonic() - run_started
+    elif job.started_at is not None:
+        # Running in another process, the rate includes any time the job spent waiting to resume
+        done = job.processed
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        elapsed = (now - job.started_at.replace(tzinfo=None)).total_seconds()
+    else:
+        return None
+
+    if done <= 0 or elapsed <= 0:
+        return None
+    return round(max(0, job.total - job.processed) * elapsed / done, 1)
+
+
+def grade_regrade_query(exercise_id, correct_query: str, expected_result: dict, user_query: str) -> dict | None:
+    for attempt in range(REGRADE_RETRIES + 1):
+        try:
+            return grade_regrade_attempt(exercise_id, correct_query, expected_result, user_query)
+        except AppException as e:
+            if e.message not in RETRYABLE_ERRORS:
+                return None
+            # Still failing, the chunk is dropped and the job resumes from its cursor
+            if attempt == REGRADE_RETRIES or regrade_stop.is_set():
+                raise
+            counters.increment("regrade.retried")
+            regrade_stop.wait(REGRADE_BACKOFF * (attempt + 1))
+
+
+def grade_regrade_attempt(exercise_id, correct_query: str, expected_result: dict, user_query: str) -> dict:
+    db = SessionLocal()
+    try:
+        with oracle_conn_context(AUTHORING) as oracle_db:
+            verdict, validation_result = grade_against_expected(db, oracle_db, exercise_id, correct_query,
+                                                                expected_result, user_query)
+    finally:
+        db.close()
+
+    validation = format_validation(validation_result)["validation"]
+    return {
+        "success": validation.get("status") == "success",
+        "stored_result_details": None if verdict else validation,
+        "verdict_id": verdict.id if verdict else None,
+    }
+
+
+def regrade_chunk(executor: ThreadPoolExecutor, db: Session, job: RegradeJob, exercise_id, correct_query: str,
+                  expected_result: dict, rows: list) -> tuple | None:
+    """Grades a chunk's distinct queries and returns the history updates, or None once the lease is lost."""
+    queries = {}
+    for row in rows:
+        queries.setdefault(statement_hash(row.response or ""), row.response or "")
+
+    futures = {
+        executor.submit(grade_regrade_query, exercise_id, correct_query, expected_result, user_query): sql_hash
+        for sql_hash, user_query in queries.items()
+    }
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=REGRADE_HEARTBEAT_INTERVAL, return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception() is not None]
+        if failed or (pending and not touch_regrade_job_db(db, job.id, job.lease_id)):
+            for future in pending:
+                future.cancel()
+            if failed:
+                raise failed[0].exception()
+            counters.increment("regrade.lease_lost")
+            return None
+    results = {sql_hash: future.result() for future, sql_hash in futures.items()}
+
+    updates = []
+    changed = errors = 0
+    for row in rows:
+        result = results[statement_hash(row.response or "")]
+        if result is None:
+            errors += 1
+            continue
+        if result["success"] != row.success:
+            changed += 1
+        updates.append({"id": row.id, **result})
+    return updates, changed, errors
+
+
+def grading_is_busy() -> bool:
+    if oracle_admissions[GRADING].waiting:
+        return True
+    return GRADING_QUEUE and grading_queue.depth() > 0
+
+
+def throttle(db: Session, job: RegradeJob) -> bool:
+    regrade_stop.wait(REGRADE_CHUNK_DELAY)
+    # Live grading goes first, the job waits while submissions queue up and keeps its lease meanwhile
+    while grading_is_busy() and not regrade_stop.is_set():
+        counters.increment("regrade.throttled")
+        if not touch_regrade_job_db(db, job.id, job.lease_id):
+            return False
+        regrade_stop.wait(REGRADE_BACKOFF)
+    return True
+
+
+def run_regrade_job(job: RegradeJob):
+    job_id, lease_id = str(job.id), job.lease_id
+    db = SessionLocal()
+    try:
+        exercise = find_exercise_by_id(str(job.exercise_id), db)
+        if exercise is None:
+            finish_regrade_job_db(db, job_id, lease_id, FAILED, ErrorCodes.EXERCISE_NOT_FOUND)
+            return
+        exercise_id, correct_query = exercise.id, exercise.response
+
+        with oracle_conn_context(AUTHORING) as oracle_db:
+            expected_result = get_expected_result(db, oracle_db, exercise)
+
+        last_history_id = job.last_history_id
+        if last_history_id is None:
+            set_regrade_total_db(db, job_id, lease_id, count_regrade_rows_db(db, exercise_id))
+        regrade_runs[job_id] = (time.monotonic(), job.processed or 0)
+
+        with ThreadPoolExecutor(max_workers=REGRADE_WORKERS, thread_name_prefix="regrade") as executor:
+            while not regrade_stop.is_set():
+                rows = get_regrade_chunk_db(db, exercise_id, last_history_id, REGRADE_CHUNK_SIZE)
+                if not rows:
+                    finish_regrade_job_db(db, job_id, lease_id, DONE)
+                    counters.increment("regrade.jobs_done")
+                    return
+
+                graded = regrade_chunk(executor, db, job, exercise_id, correct_query, expected_result, rows)
+                if graded is None:
+                    return
+                updates, changed, errors = graded
+                last_history_id = rows[-1].id
+                if not save_regrade_chunk_db(db, job_id, lease_id, updates, len(rows), changed, errors,
+                                             last_history_id):
+                    # Superseded by a newer job, or the lease went to another worker
+                    return
+                counters.increment("regrade.rows", len(rows))
+                if not throttle(db, job):
+                    return
+        # Stopped with the app, the next start picks the job up from its cursor
+        release_regrade_job_db(db, job_id, lease_id)
+    except AppException as e:
+        db.rollback()
+        if e.message in RETRYABLE_ERRORS:
+            counters.increment("regrade.deferred")
+            release_regrade_job_db(db, job_id, lease_id)
+            regrade_stop.wait(REGRADE_BACKOFF)
+            return
+        finish_regrade_job_db(db, job_id, lease_id, FAILED, e.message)
+    except Exception as e:
+        print(f"Regrade job {job_id} failed: {e}")
+        db.rollback()
+        finish_regrade_job_db(db, job_id, lease_id, FAILED, ErrorCodes.SERVER_ERROR)
+    finally:
+        regrade_runs.pop(job_id, None)
+        db.close()
+
+
+def claim_next_job() -> RegradeJob | None:
+    db = SessionLocal()
+    try:
+        job = claim_regrade_job_db(db, REGRADE_LEASE_SECONDS)
+        if job is not None:
+            db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+def regrade_runner():
+    while not regrade_stop.is_set():
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            print(f"Couldn't claim a regrade job: {e}")
+            job = None
+
+        if job is None:
+            regrade_wake.wait(REGRADE_POLL_INTERVAL)
+            regrade_wake.clear()
+            continue
+        run_regrade_job(job)
+
+
+def start_regrade_runner():
+    regrade_stop.clear()
+    runner = threading.Thread(target=regrade_runner, name="regrade-runner", daemon=True)
+    runner.start()
+    regrade_threads.append(runner)
+
+
+def stop_regrade_runner():
+    regrade_stop.set()
+    regrade_wake.set()
+    for runner in regrade_threads:
+        runner.join(timeout=REGRADE_BACKOFF * 2)
+    regrade_threads.clear()
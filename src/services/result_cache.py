@@ -0,0 +1,44 @@
+from decouple import config
+
+from src.oracle_db import DATASET_VERSION
+from src.utils.lru_cache import TTLCache, MISSING
+from src.utils.metrics import counters
+from src.utils.sql_lexer import is_cacheable_select, normalize_statement
+
+RESULT_CACHE = config("RESULT_CACHE", default=True, cast=bool)
+RESULT_CACHE_SIZE = config("RESULT_CACHE_SIZE", default=1024, cast=int)
+RESULT_CACHE_MAX_BYTES = config("RESULT_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+RESULT_CACHE_TTL = config("RESULT_CACHE_TTL", default=300, cast=float)
+
+result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL, max_weight=RESULT_CACHE_MAX_BYTES)
+
+
+def select_statement_key(query: str) -> tuple | None:
+    # Also keys single-flight coalescing, which stays on when RESULT_CACHE is off
+    if not is_cacheable_select(query):
+        counters.increment("result_cache.bypass")
+        return None
+    return normalize_statement(query), DATASET_VERSION
+
+
+def result_size(result: dict) -> int:
+    columns_size = sum(len(col) for col in result.get("columns", []))
+    return columns_size + sum(len(str(value)) + 8 for row in result.get("rows", []) for value in row)
+
+
+def get_cached_result(key: tuple):
+    if not RESULT_CACHE:
+        counters.increment("result_cache.bypass")
+        return None
+    cached = result_cache.get(key)
+    if cached is MISSING:
+        counters.increment("result_cache.miss")
+        return None
+    counters.increment("result_cache.hit")
+    return dict(cached)
+
+
+def store_result(key: tuple, result: dict):
+    if not RESULT_CACHE:
+        return
+    result_cache.set(key, dict(result), weight=result_size(result))
@@ -0,0 +1,177 @@
+from collections import deque
+from itertools import zip_longest
+
+from decouple import config
+
+from src.utils.contants import ErrorCodes
+
+COMPARE_BATCH_SIZE = config("COMPARE_BATCH_SIZE", default=500, cast=int)
+COMPARE_MAX_ROWS = config("COMPARE_MAX_ROWS", default=100000, cast=int)
+COMPARE_SAMPLE_SIZE = config("COMPARE_SAMPLE_SIZE", default=50, cast=int)
+COMPARE_PREVIEW_ROWS = config("COMPARE_PREVIEW_ROWS", default=1000, cast=int)
+
+
+def columns_verdict(teacher_cols: list, user_cols: list):
+    if user_cols == teacher_cols:
+        return None
+
+    if set(user_cols) == set(teacher_cols):
+        return {
+            "validation": {
+                "status": "error",
+                "type": "column",
+                "message": ErrorCodes.COLUMNS_ORDER_WRONG,
+                "missing_columns": [],
+                "extra_columns": []
+            }
+        }
+
+    return {
+        "validation": {
+            "status": "error",
+            "type": "column",
+            "message": ErrorCodes.COLUMNS_DOES_NOT_MATCH,
+            "missing_columns": list(set(teacher_cols) - set(user_cols)),
+            "extra_columns": list(set(user_cols) - set(teacher_cols))
+        }
+    }
+
+
+def too_large_verdict(max_rows: int = COMPARE_MAX_ROWS):
+    return {
+        "validation": {
+            "status": "error",
+            "type": "row",
+            "message": ErrorCodes.RESULTS_TOO_LARGE,
+            "max_rows": max_rows
+        }
+    }
+
+
+class StreamingResultComparator:
+    """Compares two row streams batch by batch.
+
+    Rows are kept only while they are unmatched: every teacher row increments its
+    balance, every user row decrements it and balanced rows are dropped. The order
+    check only ever buffers the lag between the two streams.
+    """
+
+    def __init__(self, teacher_cols: list, user_cols: list, has_order: bool,
+                 max_rows: int = COMPARE_MAX_ROWS, sample_size: int = COMPARE_SAMPLE_SIZE,
+                 preview_size: int = COMPARE_PREVIEW_ROWS):
+        self.teacher_cols = list(teacher_cols)
+        self.user_cols = list(user_cols)
+        self.has_order = has_order
+        self.max_rows = max_rows
+        self.sample_size = sample_size
+        self.preview_size = preview_size
+
+        self.teacher_count = 0
+        self.user_count = 0
+        self.same_order = True
+        self.too_large = False
+        self.preview = []
+
+        self._balance = {}
+        self._teacher_pending = deque()
+        self._user_pending = deque()
+
+    def feed_teacher(self, rows):
+        for row in rows:
+            self.teacher_count += 1
+            self._add(row, 1)
+            if self.same_order:
+                self._teacher_pending.append(row)
+        self._check_positions()
+        self._check_limit()
+
+    def feed_user(self, rows):
+        for row in rows:
+            self.user_count += 1
+            self._add(row, -1)
+            if self.same_order:
+                self._user_pending.append(row)
+            if len(self.preview) < self.preview_size:
+                self.preview.append(row)
+        self._check_positions()
+        self._check_limit()
+
+    def feed(self, teacher_batch, user_batch) -> bool:
+        """Feeds one batch from each side and returns whether the comparison should go on."""
+        self.feed_teacher(teacher_batch)
+        self.feed_user(user_batch)
+        return not self.too_large
+
+    def consume(self, teacher_batches, user_batches):
+        for teacher_batch, user_batch in zip_longest(teacher_batches, user_batches, fillvalue=()):
+            if not self.feed(teacher_batch, user_batch):
+                break
+        return self.verdict()
+
+    def verdict(self):
+        if self.too_large:
+            return too_large_verdict(self.max_rows)
+
+        if self._teacher_pending or self._user_pending:
+            self.same_order = False
+
+        if not self._balance:
+            if self.same_order or not self.has_order:
+                return {"validation": {"status": "success",
+                                       "message": "Correct!",
+                                       "rows_count": self.user_count,
+                                       "columns_count": len(self.user_cols),
+                                       "rows": self.preview,
+                                       "columns": list(self.user_cols)
+                                       }}
+            return {
+                "validation": {
+                    "status": "error",
+                    "message": ErrorCodes.RESULTS_ORDER_WRONG
+                }
+            }
+
+        missing_total = 0
+        extra_total = 0
+        missing_rows_sample = []
+        extra_rows_sample = []
+        for row, balance in self._balance.items():
+            if balance > 0:
+                missing_total += 1
+                if len(missing_rows_sample) < self.sample_size:
+                    missing_rows_sample.append(row)
+            else:
+                extra_total += 1
+                if len(extra_rows_sample) < self.sample_size:
+                    extra_rows_sample.append(row)
+
+        return {
+            "validation": {
+                "status": "error",
+                "type": "row",
+                "message": ErrorCodes.RESULTS_WRONG,
+                "columns": self.user_cols,
+                "missing_rows_count": missing_total,
+                "extra_rows_count": extra_total,
+                "missing_rows_sample": missing_rows_sample,
+                "extra_rows_sample": extra_rows_sample
+            }
+        }
+
+    def _add(self, row, delta):
+        balance = self._balance.get(row, 0) + delta
+        if balance:
+            self._balance[row] = balance
+        else:
+            del self._balance[row]
+
+    def _check_positions(self):
+        while self._teacher_pending and self._user_pending:
+            if self._teacher_pending.popleft() != self._user_pending.popleft():
+                self.same_order = False
+                self._teacher_pending.clear()
+                self._user_pending.clear()
+
+    def _check_limit(self):
+        if self.teacher_count > self.max_rows or self.user_count > self.max_rows:
+            self.too_large = True
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
+from src.utils.metrics import Histogram
+
+
+class _Ticket:
+    __slots__ = ("key", "granted", "waiter")
+
+    def __init__(self, key, waiter: asyncio.Future | None = None):
+        self.key = key
+        self.granted = False
+        self.waiter = waiter
+
+
+class AdmissionGate:
+    """Bounded slots with a bounded wait queue.
+
+    Freed slots are handed to waiters round-robin by key, so every waiting key gets a turn before any key gets
+    a second one.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, max_wait: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_histogram = Histogram()
+
+        self._queues = OrderedDict()
+        self._condition = threading.Condition()
+
+    def acquire(self, key=None) -> bool:
+        started = time.monotonic()
+        with self._condition:
+            if self.in_use < self.capacity and not self.waiting:
+                return self._admit(started)
+
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            ticket = _Ticket(key)
+            self._queues.setdefault(key, deque()).append(ticket)
+            self.waiting += 1
+            deadline = started + self.max_wait
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(ticket)
+                    self.timed_out += 1
+                    return False
+                self._condition.wait(remaining)
+            # The releasing thread passed its slot on, in_use already counts it
+            return self._record(started)
+
+    async def acquire_async(self, key=None) -> bool:
+        """Same as acquire, but a waiting coroutine gives the event loop back instead of blocking it."""
+        started = time.monotonic()
+        with self._condition:
+            if self.in_use < self.capacity and not self.waiting:
+                return self._admit(started)
+
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            ticket = _Ticket(key, asyncio.get_running_loop().create_future())
+            self._queues.setdefault(key, deque()).append(ticket)
+            self.waiting += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._condition:
+                if not ticket.granted:
+                    self._withdraw(ticket)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timed_out += 1
+                        return False
+                    raise
+            # The slot was handed over just as the wait ended
+            if isinstance(e, asyncio.CancelledError):
+                self.release()
+                raise
+
+        with self._condition:
+            return self._record(started)
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_use < self.capacity and not self.waiting:
+                return self._admit(time.monotonic())
+            return False
+
+    def release(self):
+        with self._condition:
+            if not self._queues:
+                self.in_use -= 1
+                return
+            self._hand_off()
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            data = {
+                "capacity": self.capacity,
+                "in_use": self.in_use,
+                "queue_depth": self.waiting,
+                "waiting_keys": len(self._queues),
+                "max_queue": self.max_queue,
+                "max_wait": self.max_wait,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+        data["wait_seconds"] = self.wait_histogram.snapshot()
+        return data
+
+    def _hand_off(self):
+        key, tickets = next(iter(self._queues.items()))
+        ticket = tickets.popleft()
+        # The key goes to the back of the rotation, or leaves it when nothing else of its is waiting
+        del self._queues[key]
+        if tickets:
+            self._queues[key] = tickets
+        ticket.granted = True
+        self.waiting -= 1
+        if ticket.waiter is not None:
+            ticket.waiter.get_loop().call_soon_threadsafe(_wake, ticket.waiter)
+
+    def _withdraw(self, ticket: _Ticket):
+        tickets = self._queues[ticket.key]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[ticket.key]
+        self.waiting -= 1
+
+    def _admit(self, started: float) -> bool:
+        self.in_use += 1
+        return self._record(started)
+
+    def _record(self, started: float) -> bool:
+        self.admitted += 1
+        self.wait_histogram.observe(time.monotonic() - started)
+        return True
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -24,6 +24,9 @@ class ErrorCodes(StrEnum):
     VISUALIZATION_ERROR = "VISUALIZATION_ERROR"
     DDL_COMMANDS = "DDL_COMMANDS"
     TCL_COMMANDS = "TCL_COMMANDS"
+    STATEMENT_NOT_ALLOWED = "STATEMENT_NOT_ALLOWED"
+    PAGE_REQUIRES_SELECT = "PAGE_REQUIRES_SELECT"
+    UNSUPPORTED_RESULT_FORMAT = "UNSUPPORTED_RESULT_FORMAT"
 
     SUPER_ADMIN_ACCESS_REQUIRED = "SUPER_ADMIN_ACCESS_REQUIRED"
     ADMIN_ACCESS_REQUIRED = "ADMIN_ACCESS_REQUIRED"
@@ -32,8 +35,21 @@ class ErrorCodes(StrEnum):
     COLUMNS_ORDER_WRONG = "COLUMNS_ORDER_WRONG"
     RESULTS_ORDER_WRONG = "RESULTS_ORDER_WRONG"
     RESULTS_WRONG = "RESULTS_WRONG"
+    RESULTS_TOO_LARGE = "RESULTS_TOO_LARGE"
     ERR_DML_WRONG_TABLE = "ERR_DML_WRONG_TABLE"
     ERR_TEACHER_SOL = "ERR_TEACHER_SOL"
     ERR_DML_NO_TABLE = "ERR_DML_NO_TABLE"
+    DML_SANDBOX_MISSING = "DML_SANDBOX_MISSING"
     SQL_ERROR = "SQL_ERROR"
+    ORACLE_POOL_BUSY = "ORACLE_POOL_BUSY"
+    RATE_LIMITED = "RATE_LIMITED"
+    GRADING_QUEUE_FULL = "GRADING_QUEUE_FULL"
+    GRADING_JOB_NOT_FOUND = "GRADING_JOB_NOT_FOUND"
+    REGRADE_JOB_NOT_FOUND = "REGRADE_JOB_NOT_FOUND"
+    REGRADE_JOBS_DISABLED = "REGRADE_JOBS_DISABLED"
+    QUERY_TIMEOUT = "QUERY_TIMEOUT"
+    QUERY_TOO_EXPENSIVE = "QUERY_TOO_EXPENSIVE"
+    EXPLAIN_REQUIRES_SELECT = "EXPLAIN_REQUIRES_SELECT"
+    PARSE_REQUIRES_QUERY = "PARSE_REQUIRES_QUERY"
+    BATCH_TOO_LARGE = "BATCH_TOO_LARGE"
     SERVER_ERROR = "SERVER_ERROR"
\ No newline at end of file
@@ -0,0 +1,55 @@
+import queue
+
+
+class MemoryJobQueue:
+    """FIFO of job ids kept in this process, jobs are lost with it."""
+
+    backend = "memory"
+
+    def __init__(self, max_depth: int):
+        self.max_depth = max_depth
+        self._queue = queue.Queue(max_depth)
+
+    def push(self, job_id: str) -> bool:
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            return False
+        return True
+
+    def pop(self, timeout: float) -> str | None:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class RedisJobQueue:
+    """FIFO of job ids in a Redis list, shared by every node pointing at the same server."""
+
+    backend = "redis"
+
+    def __init__(self, client, key: str, max_depth: int):
+        self.max_depth = max_depth
+        self._client = client
+        self._key = key
+
+    def push(self, job_id: str) -> bool:
+        # A concurrent push can overshoot by a few entries, the bound only has to hold roughly
+        if self._client.llen(self._key) >= self.max_depth:
+            return False
+        self._client.lpush(self._key, job_id)
+        return True
+
+    def pop(self, timeout: float) -> str | None:
+        item = self._client.brpop([self._key], timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        _, job_id = item
+        return job_id.decode() if isinstance(job_id, bytes) else job_id
+
+    def depth(self) -> int:
+        return self._client.llen(self._key)
@@ -0,0 +1,82 @@
+import math
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """One token bucket per key, refilled at `rate` tokens per second up to `burst`.
+
+    Buckets live in this process, every worker enforces the limit on its own.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, rate: float, burst: int) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, rate, burst)
+                if len(self._buckets) > self.max_keys:
+                    self._prune(now)
+                return 0.0
+            self._buckets[key] = (tokens, now, rate, burst)
+            return (1 - tokens) / rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend, "keys": len(self._buckets), "max_keys": self.max_keys}
+
+    def _prune(self, now: float):
+        # Buckets that have refilled carry no state, dropping them changes nothing
+        for key, (tokens, updated, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+
+
+class RedisTokenBucketLimiter:
+    """Token buckets in Redis hashes, shared by every worker and node pointing at the same server."""
+
+    backend = "redis"
+
+    def __init__(self, client, prefix: str):
+        self._client = client
+        self._prefix = prefix
+
+    def acquire(self, key, rate: float, burst: int) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        bucket_key = ":".join((self._prefix, *map(str, key if isinstance(key, tuple) else (key,))))
+        retry_after = 0.0
+
+        def take(pipe):
+            nonlocal retry_after
+            # The server clock, workers on different hosts refill the same bucket at the same pace
+            seconds, microseconds = pipe.time()
+            now = seconds + microseconds / 1_000_000
+            stored_tokens, stored_updated = pipe.hmget(bucket_key, "tokens", "updated")
+            tokens = burst if stored_tokens is None else float(stored_tokens)
+            updated = now if stored_updated is None else float(stored_updated)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+
+            pipe.multi()
+            pipe.hset(bucket_key, mapping={"tokens": tokens, "updated": now})
+            # A refilled bucket carries no state, Redis drops it on its own
+            pipe.expire(bucket_key, math.ceil(burst / rate) + 1)
+
+        self._client.transaction(take, bucket_key)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {"backend": self.backend}
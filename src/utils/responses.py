@@ -1,16 +1,32 @@
+import json
+
+import orjson
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 
 
+def dump_json(content) -> bytes:
+    try:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # NUMBER columns can hold integers past 64 bits, orjson refuses those without calling default
+        return json.dumps(content, default=jsonable_encoder, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
 def ok(data=None, status_code: int = 200, meta: dict | None = None) -> JSONResponse:
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
-        content=jsonable_encoder({"success": True, "data": data}),
+        content={"success": True, "data": data},
     )
 
 
 def err(code: str, message: str, status_code: int = 400, details: dict | None = None) -> JSONResponse:
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
-        content=jsonable_encoder({"success": False, "error": {"code": code, "message": message, "details": details}}),
+        content={"success": False, "error": {"code": code, "message": message, "details": details}},
     )
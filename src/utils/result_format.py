@@ -0,0 +1,65 @@
+ROWS = "rows"
+COMPACT = "compact"
+COLUMNAR = "columnar"
+
+RESULT_FORMATS = (ROWS, COMPACT, COLUMNAR)
+ACCEPT_MEDIA_TYPES = {
+    "application/vnd.sqllearner.compact+json": COMPACT,
+    "application/vnd.sqllearner.columnar+json": COLUMNAR,
+}
+
+VALIDATION_ROW_KEYS = ("missing_rows_sample", "extra_rows_sample")
+DELTA_ROW_KEYS = ("inserted", "deleted", "updated_before", "updated_after")
+
+
+def prepare_unique_cols(raw_cols):
+    unique_cols = []
+    col_counts = {}
+
+    for col in raw_cols:
+        if col in col_counts:
+            col_counts[col] += 1
+            unique_cols.append(f"{col}_{col_counts[col]}")
+        else:
+            col_counts[col] = 0
+            unique_cols.append(col)
+    return unique_cols
+
+
+def shape_rows(columns: list, rows: list, result_format: str = ROWS):
+    if result_format == ROWS:
+        return [dict(zip(columns, row)) for row in rows]
+    if result_format == COLUMNAR:
+        if not rows:
+            return [[] for _ in columns]
+        return [list(column) for column in zip(*rows)]
+    return [list(row) for row in rows]
+
+
+def format_query_result(result: dict, result_format: str = ROWS):
+    row_keys = [key for key in ("rows", *DELTA_ROW_KEYS) if key in result]
+    if not row_keys:
+        return result
+
+    formatted = dict(result)
+    for key in row_keys:
+        formatted[key] = shape_rows(result["columns"], result[key], result_format)
+    if result_format != ROWS:
+        formatted["format"] = result_format
+    return formatted
+
+
+def format_validation(result: dict, result_format: str = ROWS):
+    validation = result.get("validation", {})
+    columns = validation.get("columns", [])
+    formatted = dict(validation)
+
+    if "rows" in validation:
+        formatted["rows"] = shape_rows(prepare_unique_cols(columns), validation["rows"], result_format)
+    for key in VALIDATION_ROW_KEYS:
+        if key in validation:
+            formatted[key] = shape_rows(columns, validation[key], result_format)
+    if result_format != ROWS and columns:
+        formatted["format"] = result_format
+
+    return {**result, "validation": formatted}
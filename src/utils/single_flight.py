@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = []
+
+
+class SingleFlight:
+    """Runs one call per key at a time, concurrent callers with the same key wait for it and share its outcome."""
+
+    def __init__(self):
+        self.executed = 0
+        self.shared = 0
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if leader:
+            return self._run(key, call, fn, args, kwargs)
+        return self._wait(call)
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Same as do for coroutine functions, waiting callers await the leader without holding a thread."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+                waiter = asyncio.get_running_loop().create_future()
+                call.waiters.append(waiter)
+
+        if not leader:
+            await waiter
+            return self._outcome(call)
+
+        try:
+            call.result = await fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "shared": self.shared,
+            }
+
+    def _run(self, key, call: _Call, fn, args, kwargs):
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def _finish(self, key, call: _Call):
+        with self._lock:
+            del self._calls[key]
+            waiters = call.waiters
+        call.done.set()
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    @classmethod
+    def _wait(cls, call: _Call):
+        call.done.wait()
+        return cls._outcome(call)
+
+    @staticmethod
+    def _outcome(call: _Call):
+        if call.error is not None:
+            raise _shared_error(call.error) from call.error
+        return call.result
+
+
+def _shared_error(error: BaseException) -> BaseException:
+    # Followers get a copy flagged as shared, only the leader reacts to the failure (e.g. drops its connection)
+    shared = type(error).__new__(type(error))
+    shared.__dict__.update(error.__dict__)
+    shared.args = error.args
+    shared.shared = True
+    return shared
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+single_flight = SingleFlight()
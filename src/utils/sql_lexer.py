@@ -0,0 +1,260 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
+
+DDL_KEYWORDS = frozenset({"create", "drop", "alter", "truncate"})
+TCL_KEYWORDS = frozenset({"commit", "savepoint", "rollback"})
+DML_KEYWORDS = frozenset({"insert", "update", "delete", "merge"})
+# Statements that only touch rows, everything else may change the schema or the session as soon as it is parsed
+QUERY_KEYWORDS = frozenset({"select", "with"}) | DML_KEYWORDS
+VOLATILE_KEYWORDS = frozenset({"sysdate", "systimestamp", "current_date", "current_timestamp", "localtimestamp",
+                               "dbms_random", "nextval", "currval", "sys_guid", "sys_context", "userenv", "sample",
+                               "dbms_lock", "ora_rowscn"})
+
+WORD = "word"
+QUOTED_IDENTIFIER = "quoted_identifier"
+LITERAL = "literal"
+SYMBOL = "symbol"
+
+TOKEN_PATTERN = re.compile(r"""
+      (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<literal>
+          n?q'(?:\[.*?\]|\{.*?\}|\(.*?\)|<.*?>|(?P<delimiter>\S).*?(?P=delimiter))'
+        | n?'(?:[^']|'')*'?
+        | \d[\w.]*
+      )
+    | (?P<quoted_identifier>"[^"]*"?)
+    | (?P<word>[^\W\d][\w$#]*)
+    | (?P<symbol>[^\s\w])
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class StatementClassification:
+    kind: str
+    target_table: str | None
+    forbidden_keywords: tuple[str, ...]
+    has_order_by: bool
+
+    @property
+    def is_dml(self) -> bool:
+        return self.kind == "dml"
+
+
+def tokenize(query: str) -> list[Token]:
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        text = match.group()
+        if kind == QUOTED_IDENTIFIER:
+            text = text.strip('"')
+        tokens.append(Token(kind, text, match.start(), match.end()))
+    return tokens
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(query: str) -> str:
+    parts = []
+    for token in tokenize(query or ""):
+        if token.kind == WORD:
+            parts.append(token.text.lower())
+        elif token.kind == QUOTED_IDENTIFIER:
+            parts.append(f'"{token.text}"')
+        else:
+            parts.append(token.text)
+    if parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def declares_plsql(query: str) -> bool:
+    """Whether a WITH clause declares inline PL/SQL functions or procedures."""
+    words = [token.text.lower() for token in tokenize(query or "")[:3] if token.kind == WORD]
+    return words[:1] == ["with"] and words[1:2] in (["function"], ["procedure"])
+
+
+def leading_keyword(query: str) -> str | None:
+    for token in tokenize(query or ""):
+        if token.kind == WORD:
+            return token.text.lower()
+        if token.text != "(":
+            return None
+    return None
+
+
+def add_hint(query: str, hint: str) -> str:
+    # The hint belongs to the main query block, the WITH clause bodies sit inside parentheses
+    selects = []
+    depth = 0
+    for token in tokenize(query):
+        if token.kind == SYMBOL and token.text in "()":
+            depth += 1 if token.text == "(" else -1
+        elif token.kind == WORD and token.text.lower() == "select":
+            selects.append((depth, token))
+    if not selects:
+        return query
+    token = min(selects, key=lambda select: select[0])[1]
+    return f"{query[:token.end]} /*+ {hint} */{query[token.end:]}"
+
+
+def _identifier_at(tokens: list[Token], index: int) -> str | None:
+    parts = []
+    while index < len(tokens):
+        token = tokens[index]
+        if token.kind == WORD:
+            parts.append(token.text.upper())
+        elif token.kind == QUOTED_IDENTIFIER:
+            parts.append(token.text)
+        else:
+            break
+
+        if index + 2 < len(tokens) and tokens[index + 1].text == ".":
+            index += 2
+        else:
+            break
+
+    return ".".join(parts) if parts else None
+
+
+def _find_target_table(tokens: list[Token], words: list[str]) -> str | None:
+    for index, word in enumerate(words):
+        if word in ("insert", "merge") and index + 1 < len(words) and words[index + 1] == "into":
+            return _identifier_at(tokens, index + 2)
+        if word == "update" and (index == 0 or words[index - 1] != "for"):
+            return _identifier_at(tokens, index + 1)
+        if word == "delete":
+            if index + 1 < len(words) and words[index + 1] == "from":
+                return _identifier_at(tokens, index + 2)
+            return _identifier_at(tokens, index + 1)
+    return None
+
+
+@lru_cache(maxsize=2048)
+def classify_statement(query: str) -> StatementClassification:
+    tokens = tokenize(query or "")
+    words = [token.text.lower() if token.kind == WORD else "" for token in tokens]
+
+    forbidden = []
+    has_dml = False
+    has_order_by = False
+    for index, word in enumerate(words):
+        if word in DDL_KEYWORDS or word in TCL_KEYWORDS:
+            forbidden.append(word)
+        elif word in DML_KEYWORDS:
+            if word != "update" or index == 0 or words[index - 1] != "for":
+                has_dml = True
+        elif word == "order" and index + 1 < len(words) and words[index + 1] == "by":
+            has_order_by = True
+
+    if any(word in DDL_KEYWORDS for word in forbidden):
+        kind = "ddl"
+    elif forbidden:
+        kind = "tcl"
+    elif has_dml:
+        kind = "dml"
+    else:
+        kind = "select"
+
+    return StatementClassification(
+        kind=kind,
+        target_table=_find_target_table(tokens, words) if has_dml else None,
+        forbidden_keywords=tuple(forbidden),
+        has_order_by=has_order_by,
+    )
+
+
+def _identifier_part_matches(token: Token, part: str) -> bool:
+    if token.kind == WORD:
+        return token.text.upper() == part
+    return token.kind == QUOTED_IDENTIFIER and token.text == part
+
+
+def _match_identifier(tokens: list[Token], index: int, parts: list[str]) -> int | None:
+    last = index + 2 * (len(parts) - 1)
+    if last >= len(tokens):
+        return None
+    for offset, part in enumerate(parts):
+        position = index + 2 * offset
+        if offset and tokens[position - 1].text != ".":
+            return None
+        if not _identifier_part_matches(tokens[position], part):
+            return None
+    return last
+
+
+def replace_table_references(query: str, table: str, replacement: str) -> str:
+    tokens = tokenize(query)
+    parts = table.split(".")
+    pieces = []
+    last_end = 0
+    index = 0
+    while index < len(tokens):
+        match_end = None
+        if index == 0 or tokens[index - 1].text != ".":
+            match_end = _match_identifier(tokens, index, parts)
+        if match_end is None:
+            index += 1
+            continue
+        pieces.append(query[last_end:tokens[index].start])
+        pieces.append(replacement)
+        last_end = tokens[match_end].end
+        index = match_end + 1
+
+    pieces.append(query[last_end:])
+    return "".join(pieces)
+
+
+@lru_cache(maxsize=2048)
+def strip_statement_end(query: str) -> str | None:
+    """Drops trailing semicolons and comments, or returns None when the text holds more than one statement."""
+    tokens = tokenize(query or "")
+    while tokens and tokens[-1].kind == SYMBOL and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens or any(token.kind == SYMBOL and token.text == ";" for token in tokens):
+        return None
+    return query[:tokens[-1].end]
+
+
+def supports_returning(query: str) -> bool:
+    words = [token.text.lower() for token in tokenize(query or "") if token.kind == WORD]
+    if not words or "returning" in words:
+        return False
+    if words[0] in ("update", "delete"):
+        return True
+    return words[0] == "insert" and words[1:2] == ["into"] and "select" not in words
+
+
+@lru_cache(maxsize=2048)
+def is_cacheable_select(query: str) -> bool:
+    if classify_statement(query).kind != "select" or not is_deterministic(query):
+        return False
+
+    words = [token.text.lower() for token in tokenize(query or "") if token.kind == WORD]
+    for index, word in enumerate(words):
+        if word == "for" and index + 1 < len(words) and words[index + 1] == "update":
+            return False
+    return bool(words)
+
+
+@lru_cache(maxsize=2048)
+def is_deterministic(query: str) -> bool:
+    for token in tokenize(query or ""):
+        word = token.text.lower()
+        if token.kind == WORD and (word in VOLATILE_KEYWORDS or word.startswith(("v$", "gv$"))):
+            return False
+    return True
+
+
+def statement_hash(query: str) -> str:
+    return hashlib.sha256(normalize_statement(query).encode()).hexdigest()